@@ -0,0 +1,97 @@
+#! /usr/bin/python
+########################################################################
+# Benchmark the diff renderer against the old per line renderer
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+# Run from the root of the repository with
+#	python benchmarks/diffrender-benchmark.py [lines]
+########################################################################
+import sys
+from os.path import dirname
+from os.path import join as pathJoin
+from timeit import default_timer
+# use the libaries from the repository instead of the installed ones
+sys.path.insert(0, pathJoin(dirname(dirname(__file__)), 'lib'))
+from diffrender import renderDiff
+########################################################################
+def escapeHTML(text):
+	'''
+	The escaping done by cgi.escape() used by the old renderer.
+	'''
+	return text.replace('&','&amp;').replace('<','&lt;').replace('>','&gt;')
+########################################################################
+def legacyRenderDiff(lines):
+	'''
+	The per line diff renderer that was used by main.gitLog.
+	'''
+	logOutput = ''
+	for line in escapeHTML('\n'.join(lines)).split('\n'):
+		if len(line) > 1:
+			# replace all tabs with 4 spaces
+			while '\t' in line:
+				line=line.replace('\t',('&nbsp;'*4))
+			# place added and removed lines into classes to color them with css
+			if line[0] == "+" and line[1] != "+":
+				logOutput += '<span class="addedLine">'+line+'</span><br />\n'
+			elif line[0] == "-" and line[1] != "-":
+				logOutput += '<span class="removedLine">'+line+'</span><br />\n'
+			else:
+				logOutput += (line.replace(' ','&nbsp;'))+'<br />\n'
+	return logOutput
+########################################################################
+def buildDiff(lineCount):
+	'''
+	Build a diff with about lineCount lines spread across files with
+	100 line hunks.
+	'''
+	lines = list()
+	fileNumber = 0
+	while len(lines) < lineCount:
+		fileNumber += 1
+		lines.append('diff --git a/file'+str(fileNumber)+'.py b/file'+str(fileNumber)+'.py')
+		lines.append('index 0000000..1111111 100644')
+		lines.append('--- a/file'+str(fileNumber)+'.py')
+		lines.append('+++ b/file'+str(fileNumber)+'.py')
+		lines.append('@@ -1,60 +1,60 @@ def example():')
+		for number in range(100):
+			if number % 5 == 0:
+				lines.append('+\tif value < limit and other > 0: # added <b>')
+			elif number % 7 == 0:
+				lines.append('-\t\treturn "old" & "value"')
+			else:
+				lines.append(' \tunchanged = function(argument, other)')
+	return lines
+########################################################################
+def timeRenderer(renderer, lines):
+	'''
+	Return the number of lines rendered each second by renderer.
+	'''
+	start = default_timer()
+	renderer(lines)
+	return len(lines) / (default_timer() - start)
+########################################################################
+if __name__ == '__main__':
+	if len(sys.argv) > 1:
+		lineCount = int(sys.argv[1])
+	else:
+		lineCount = 200000
+	lines = buildDiff(lineCount)
+	legacySpeed = timeRenderer(legacyRenderDiff, lines)
+	speed = timeRenderer(renderDiff, lines)
+	print('Rendered '+str(len(lines))+' diff lines')
+	print('old renderer     : '+str(int(legacySpeed))+' lines/sec')
+	print('diffrender       : '+str(int(speed))+' lines/sec')
+	print('speedup          : '+str(round(speed / legacySpeed, 1))+'x')
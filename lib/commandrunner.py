@@ -0,0 +1,340 @@
+########################################################################
+# Run external commands with streamed output, timeouts and limits
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+import sys
+import signal
+from os.path import dirname
+from subprocess import Popen
+from subprocess import PIPE
+from threading import Timer
+from timeit import default_timer
+import timing
+from workspace import moveFile
+from workspace import removeWorkspace
+from workspace import scratchPath
+########################################################################
+# the defaults used when a command does not set its own limits, these
+# are set from the command line options before the stages start
+defaultTimeout = None
+defaultMemoryLimit = None
+# the size of the blocks read from a command that is streamed to a file
+blockSize = 65536
+# every command is started in its own process group so it can be killed
+# along with its children, python 3 does this without running python
+# code in the child which is not safe while other threads are running
+if sys.version_info[0] >= 3:
+	groupOptions = {'start_new_session': True}
+else:
+	groupOptions = {'preexec_fn': os.setpgrp}
+########################################################################
+class commandResult():
+	'''
+	The result of a finished command.
+
+	returnCode is the exit status of the command, negative if it was
+	killed by a signal, for a pipeline it is the status of the last
+	command and returnCodes holds the status of every command. output
+	is the decoded output if it was captured and None otherwise.
+	timedOut is True if the command was killed for running longer than
+	its timeout.
+	'''
+	def __init__(self, arguments):
+		self.arguments = arguments
+		self.returnCode = None
+		self.returnCodes = list()
+		self.output = None
+		self.outputBytes = 0
+		self.timedOut = False
+		self.wallTime = 0.0
+		self.cpuTime = 0.0
+		self.peakRss = 0
+	def succeeded(self):
+		'''
+		Return True if every command exited with a status of 0.
+		'''
+		return self.returnCode == 0 and not [code for code in self.returnCodes if code != 0]
+########################################################################
+class commandError(Exception):
+	'''
+	Raised when a command that is read as a stream fails, times out or
+	can not be started, so the output that was read is not complete.
+	result is the commandResult of the command.
+	'''
+	def __init__(self, result):
+		if result.timedOut:
+			reason = 'timed out'
+		else:
+			reason = 'failed with exit status '+str(result.returnCode)
+		Exception.__init__(self, 'Command '+reason+': '+' '.join(result.arguments))
+		self.result = result
+########################################################################
+def findProgram(name):
+	'''
+	Return the path of the program name found in the PATH or False if it
+	is not installed.
+	'''
+	for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+		path = os.path.join(directory, name)
+		if os.path.isfile(path) and os.access(path, os.X_OK):
+			return path
+	return False
+########################################################################
+def limitCommand(arguments, memoryLimit):
+	'''
+	Return the arguments that run the command with its memory limited to
+	memoryLimit bytes. The limit is set by prlimit, or by ulimit in the
+	shell if it is not installed, which then runs the command in its
+	place.
+	'''
+	if memoryLimit == None:
+		return arguments
+	if os.sep not in arguments[0] and not findProgram(arguments[0]):
+		# leave the missing command to fail when it is started
+		return arguments
+	if findProgram('prlimit'):
+		return ['prlimit', '--as='+str(memoryLimit), '--'] + arguments
+	# ulimit takes the limit in kilobytes
+	return ['sh', '-c', 'ulimit -v '+str(memoryLimit // 1024)+' && exec "$@"', \
+		'sh'] + arguments
+########################################################################
+def killProcesses(processes, result):
+	'''
+	Kill the process groups of processes after a timeout.
+	'''
+	result.timedOut = True
+	for process in processes:
+		try:
+			os.killpg(process.pid, signal.SIGKILL)
+		except OSError:
+			# the process already finished
+			pass
+########################################################################
+def startProcesses(commands, stdin, cwd, env, memoryLimit, hideErrors):
+	'''
+	Start a pipeline of commands, each command reads the output of the
+	one before it and the output of the last command is read from a
+	pipe. Return the list of started processes or raise OSError if a
+	command could not be started.
+	'''
+	if hideErrors:
+		errorFile = open(os.devnull, 'wb')
+	else:
+		errorFile = None
+	processes = list()
+	try:
+		for index, arguments in enumerate(commands):
+			if index == 0:
+				commandInput = stdin
+			else:
+				commandInput = processes[-1].stdout
+			try:
+				process = Popen(limitCommand(arguments, memoryLimit), stdin=commandInput, \
+					stdout=PIPE, stderr=errorFile, cwd=cwd, env=env, **groupOptions)
+			except OSError:
+				# stop the commands already started in the pipeline
+				killProcesses(processes, commandResult(arguments))
+				for started in processes:
+					started.stdout.close()
+					started.wait()
+				raise
+			if index > 0:
+				# only the next command should hold the pipe open
+				processes[-1].stdout.close()
+			processes.append(process)
+	finally:
+		if errorFile != None:
+			errorFile.close()
+	return processes
+########################################################################
+def waitProcesses(processes, result):
+	'''
+	Wait for all of the processes in a pipeline and record the exit
+	status of the last command and the resources used by all of them.
+	'''
+	for process in processes:
+		# os.wait4() gives the resource use of this command only
+		pid, status, usage = os.wait4(process.pid, 0)
+		if os.WIFSIGNALED(status):
+			process.returncode = -os.WTERMSIG(status)
+		else:
+			process.returncode = os.WEXITSTATUS(status)
+		result.cpuTime += usage.ru_utime + usage.ru_stime
+		result.peakRss = max(result.peakRss, usage.ru_maxrss)
+		result.returnCodes.append(process.returncode)
+	result.returnCode = processes[-1].returncode
+########################################################################
+def finishResult(result, start, debug):
+	'''
+	Record a finished command in the timing and debug output.
+	'''
+	result.wallTime = default_timer() - start
+	timing.recordCommandUsage(result.arguments, result.wallTime, \
+		result.cpuTime, result.peakRss, result.outputBytes)
+	if debug != None:
+		debug.add('Command finished with exit status', result.returnCode)
+		if result.timedOut:
+			debug.warning('Command was killed after timing out', result.arguments)
+########################################################################
+def runPipeline(commands, outputFile=None, lineCallback=None, inputFile=None, \
+		timeout=None, memoryLimit=None, cwd=None, env=None, hideErrors=False, debug=None):
+	'''
+	Run a pipeline of commands, each one a list of arguments, without a
+	shell and return a commandResult.
+
+	The output of the last command is written to outputFile if it is
+	given, which is an open file or a path. Otherwise if lineCallback is
+	given it is called with each line of output as it is read. If
+	neither is given the output is captured as a string in the result.
+	Output for a path is written to a scratch file that replaces the
+	path once the pipeline finishes.
+
+	The whole pipeline is killed if it runs longer than timeout seconds,
+	the default timeout is used if it is None and there is no limit if
+	it is 0. Every command is limited to memoryLimit bytes of memory. The
+	error output of the commands is thrown away if hideErrors is True.
+	'''
+	if timeout == None:
+		timeout = defaultTimeout
+	if memoryLimit == None:
+		memoryLimit = defaultMemoryLimit
+	commands = [list(arguments) for arguments in commands]
+	result = commandResult(commands[-1] if len(commands) == 1 else commands)
+	if debug != None:
+		debug.add('Running command', result.arguments)
+	start = default_timer()
+	# open the output file if a path was given
+	closeOutput = False
+	if outputFile != None and not hasattr(outputFile, 'write'):
+		outputPath = outputFile
+		scratchFile = scratchPath(outputPath)
+		outputFile = open(scratchFile, 'wb')
+		closeOutput = True
+	try:
+		processes = startProcesses(commands, inputFile, cwd, env, memoryLimit, hideErrors)
+	except OSError as error:
+		# the command does not exist or can not be run
+		if closeOutput:
+			# do not leave an empty output file behind
+			outputFile.close()
+			removeWorkspace(dirname(scratchFile))
+		result.returnCode = 127
+		result.output = ''
+		if debug != None:
+			debug.warning('Command could not be started', str(error))
+		return result
+	timer = None
+	if timeout:
+		timer = Timer(timeout, killProcesses, (processes, result))
+		timer.daemon = True
+		timer.start()
+	stream = processes[-1].stdout
+	captured = list()
+	if outputFile != None:
+		# copy the output in blocks so it is never held in memory
+		for block in iter(lambda: stream.read(blockSize), b''):
+			result.outputBytes += len(block)
+			outputFile.write(block)
+	elif lineCallback != None:
+		for line in iter(stream.readline, b''):
+			result.outputBytes += len(line)
+			lineCallback(line.decode('utf-8', 'replace'))
+	else:
+		for block in iter(lambda: stream.read(blockSize), b''):
+			result.outputBytes += len(block)
+			captured.append(block)
+		result.output = b''.join(captured).decode('utf-8', 'replace')
+	stream.close()
+	waitProcesses(processes, result)
+	if timer != None:
+		timer.cancel()
+	if closeOutput:
+		outputFile.close()
+		moveFile(scratchFile, outputPath)
+	finishResult(result, start, debug)
+	return result
+########################################################################
+def runCommand(arguments, **options):
+	'''
+	Run a single command given as a list of arguments, see runPipeline()
+	for the options. Return a commandResult.
+	'''
+	return runPipeline([arguments], **options)
+########################################################################
+def streamLines(arguments, maxLength=None, timeout=None, memoryLimit=None, \
+		cwd=None, env=None, hideErrors=False, debug=None):
+	'''
+	Generator yielding each raw line of output from a command as it is
+	read. Lines longer than maxLength are cut down to maxLength and the
+	rest of the line is thrown away. The command is killed if the
+	generator is closed early or runs longer than timeout seconds. The
+	default timeout is not used since the command runs for as long as
+	the reader takes to use the lines.
+
+	Once the output is read commandError is raised if the command could
+	not be started, failed or was killed, so a caller never mistakes the
+	output of a failed command for the complete output.
+	'''
+	if memoryLimit == None:
+		memoryLimit = defaultMemoryLimit
+	result = commandResult(list(arguments))
+	if debug != None:
+		debug.add('Running command', result.arguments)
+	start = default_timer()
+	try:
+		processes = startProcesses([result.arguments], None, cwd, env, memoryLimit, hideErrors)
+	except OSError as error:
+		result.returnCode = 127
+		if debug != None:
+			debug.warning('Command could not be started', str(error))
+		raise commandError(result)
+	timer = None
+	if timeout:
+		timer = Timer(timeout, killProcesses, (processes, result))
+		timer.daemon = True
+		timer.start()
+	stream = processes[-1].stdout
+	finished = False
+	try:
+		while True:
+			if maxLength == None:
+				line = stream.readline()
+			else:
+				line = stream.readline(maxLength)
+			if not line:
+				break
+			result.outputBytes += len(line)
+			if maxLength != None and not line.endswith(b'\n'):
+				# throw away the rest of the line
+				remainder = line
+				while remainder and not remainder.endswith(b'\n'):
+					remainder = stream.readline(maxLength)
+					result.outputBytes += len(remainder)
+			yield line
+		finished = True
+	finally:
+		if not finished:
+			# the reader stopped early so the command is no longer needed
+			killProcesses(processes, result)
+			result.timedOut = False
+		stream.close()
+		waitProcesses(processes, result)
+		if timer != None:
+			timer.cancel()
+		finishResult(result, start, debug)
+	if not result.succeeded():
+		raise commandError(result)
@@ -0,0 +1,93 @@
+########################################################################
+# Convert git diff output into html for the git log report
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import re
+########################################################################
+# characters that must be escaped in html, the ampersand must be first
+escapeTable = (
+	(u'&', u'&amp;'),
+	(u'<', u'&lt;'),
+	(u'>', u'&gt;')
+)
+# the start of each file in a diff
+fileStart = u'\ndiff '
+# the first hunk of a file, everything before it is the file header
+hunkStartPattern = re.compile(r'^@@', re.M)
+# binary files have no hunks, only a line in the file header
+binaryPattern = re.compile(r'^(Binary files .* differ|GIT binary patch)$', re.M)
+# lines inside of the hunks are classified by their first character
+lineClasses = {
+	u'+': (u'<span class="addedLine">', u'</span>'),
+	u'-': (u'<span class="removedLine">', u'</span>'),
+	u'@': (u'<span class="hunkHeader">', u'</span>')
+}
+########################################################################
+def escapeDiff(text):
+	'''
+	Escape the whole text of a diff for html at once.
+	'''
+	for character, replacement in escapeTable:
+		text = text.replace(character, replacement)
+	return text
+########################################################################
+def renderFile(section):
+	'''
+	Render the escaped diff of a single file as html. The file header
+	is left as it is and the lines of the hunks are wrapped in spans
+	to color them with css.
+	'''
+	hunkStart = hunkStartPattern.search(section)
+	if hunkStart == None:
+		# there are no hunks in renames, mode changes and binary files
+		return binaryPattern.sub(r'<span class="binaryFile">\1</span>', section)
+	header = section[:hunkStart.start()]
+	# header lines like "+++ b/file" are never classified since they are
+	# outside of the hunks
+	body = section[hunkStart.start():].split(u'\n')
+	classes = lineClasses
+	body = [classes[line[:1]][0]+line+classes[line[:1]][1] \
+		if line[:1] in classes else line for line in body]
+	return header + u'\n'.join(body)
+########################################################################
+def renderDiff(lines, omittedLines=0):
+	'''
+	Render the lines of a diff as html and return it as a string.
+
+	The diff is escaped as a whole and split into files with string
+	searches, only the hunk lines are classified one at a time. The
+	output keeps its whitespace with css so spaces and tabs do not need
+	to be replaced. If omittedLines is given a note is added to the end
+	of the diff.
+	'''
+	text = escapeDiff(u'\n'.join(lines))
+	# find the start of each file in the diff, str.find() is much faster
+	# than a multiline regular expression for a fixed string
+	starts = [0]
+	position = text.find(fileStart)
+	while position != -1:
+		starts.append(position + 1)
+		position = text.find(fileStart, position + 1)
+	starts.append(len(text))
+	output = [u"<div class='diffLines' style='white-space: pre-wrap;'>"]
+	for index in range(len(starts) - 1):
+		output.append(renderFile(text[starts[index]:starts[index + 1]]))
+	output.append(u'</div>\n')
+	if omittedLines > 0:
+		# the diff was cut short when it was read
+		output.append(u"<div class='omittedLines'>Diff too large, "+\
+			str(omittedLines)+u" lines omitted</div>\n")
+	return u''.join(output)
@@ -0,0 +1,151 @@
+########################################################################
+# Persistent content addressed cache for generated report pieces
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+import hashlib
+from shutil import copyfile
+from os.path import expanduser
+from os.path import join as pathJoin
+from os.path import exists as pathExists
+########################################################################
+def defaultCacheDirectory():
+	'''
+	Return the directory used for the cache when none is given, this
+	follows the XDG base directory spec.
+	'''
+	cacheHome = os.environ.get('XDG_CACHE_HOME', '')
+	if cacheHome == '':
+		cacheHome = pathJoin(expanduser('~'), '.cache')
+	return pathJoin(cacheHome, 'project-report')
+########################################################################
+def hashKey(*parts):
+	'''
+	Build a cache key from any number of strings.
+	'''
+	keyHash = hashlib.sha256()
+	for part in parts:
+		if not isinstance(part, bytes):
+			part = part.encode('utf-8')
+		# include the length so the parts can not run together
+		keyHash.update(str(len(part)).encode('utf-8')+b':')
+		keyHash.update(part)
+	return keyHash.hexdigest()
+########################################################################
+def hashFile(filePath):
+	'''
+	Return the sha256 of the content of the file at filePath or False
+	if it can not be read.
+	'''
+	fileHash = hashlib.sha256()
+	try:
+		fileObject = open(filePath, 'rb')
+	except IOError:
+		return False
+	for block in iter(lambda: fileObject.read(65536), b''):
+		fileHash.update(block)
+	fileObject.close()
+	return fileHash.hexdigest()
+########################################################################
+class diskCache():
+	'''
+	A cache of files stored on disk under directory/section/.
+
+	Entries are named by their key and the modification time of an
+	entry is updated every time it is read. When the section grows
+	past maxBytes the least recently used entries are removed.
+	'''
+	def __init__(self, section, directory=None, maxBytes=500*1024*1024):
+		if directory == None:
+			directory = defaultCacheDirectory()
+		self.directory = pathJoin(directory, section)
+		self.maxBytes = maxBytes
+		if not pathExists(self.directory):
+			try:
+				os.makedirs(self.directory)
+			except OSError:
+				# another process may have created it first
+				pass
+	def path(self, key):
+		'''
+		Return the path of the file for the entry stored under key.
+		'''
+		return pathJoin(self.directory, key)
+	def has(self, key):
+		'''
+		Return True if there is an entry for key and mark it as used.
+		'''
+		try:
+			os.utime(self.path(key), None)
+		except OSError:
+			return False
+		return True
+	def get(self, key):
+		'''
+		Return the content stored under key or False if there is none.
+		'''
+		if not self.has(key):
+			return False
+		try:
+			fileObject = open(self.path(key), 'rb')
+		except IOError:
+			return False
+		content = fileObject.read()
+		fileObject.close()
+		return content
+	def put(self, key, content):
+		'''
+		Store content under key. The entry is written to a temporary file
+		first so other processes never read a partial entry.
+		'''
+		if not isinstance(content, bytes):
+			content = content.encode('utf-8')
+		tempPath = self.path(key)+'.'+str(os.getpid())+'.tmp'
+		fileObject = open(tempPath, 'wb')
+		fileObject.write(content)
+		fileObject.close()
+		os.rename(tempPath, self.path(key))
+	def putFile(self, key, filePath):
+		'''
+		Store a copy of the file at filePath under key.
+		'''
+		tempPath = self.path(key)+'.'+str(os.getpid())+'.tmp'
+		copyfile(filePath, tempPath)
+		os.rename(tempPath, self.path(key))
+	def prune(self):
+		'''
+		Remove the least recently used entries until the section is no
+		larger than maxBytes.
+		'''
+		entries = list()
+		totalBytes = 0
+		for name in os.listdir(self.directory):
+			try:
+				status = os.stat(pathJoin(self.directory, name))
+			except OSError:
+				continue
+			entries.append((status.st_mtime, status.st_size, name))
+			totalBytes += status.st_size
+		# oldest entries are removed first
+		entries.sort()
+		for mtime, size, name in entries:
+			if totalBytes <= self.maxBytes:
+				break
+			try:
+				os.remove(pathJoin(self.directory, name))
+			except OSError:
+				continue
+			totalBytes -= size
@@ -0,0 +1,152 @@
+########################################################################
+# Generate python documentation with pydoc inside worker processes
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+import sys
+import pydoc
+from os.path import basename
+from os.path import dirname
+from os.path import exists as pathExists
+from os.path import join as pathJoin
+from multiprocessing import Process
+from timeit import default_timer
+from diskcache import diskCache
+from diskcache import hashFile
+from diskcache import hashKey
+from workspace import enterWorkspace
+from workspace import linkFile
+from workspace import moveFile
+from workspace import scratchPath
+try:
+	# block on the process sentinels when available
+	from multiprocessing.connection import wait as waitForProcesses
+except ImportError:
+	waitForProcesses = None
+########################################################################
+def moduleName(filePath):
+	'''
+	Return the name of the module in the python file at filePath.
+	'''
+	fileName = basename(filePath)
+	if fileName.endswith('.py'):
+		fileName = fileName[:-3]
+	return fileName
+########################################################################
+def documentModule(filePath):
+	'''
+	Import the python file at filePath and return the pydoc html page
+	for it, this is the same page "pydoc -w" writes. Return False if
+	the module can not be imported.
+	'''
+	# imported modules should not leave .pyc files in the project
+	sys.dont_write_bytecode = True
+	# let the module import other modules next to it
+	searchPath = list(sys.path)
+	sys.path.insert(0, dirname(filePath))
+	try:
+		module = pydoc.importfile(filePath)
+		name = moduleName(filePath)
+		return pydoc.html.page(pydoc.describe(module), pydoc.html.document(module, name))
+	except (Exception, SystemExit):
+		# importing runs the module so anything can go wrong
+		return False
+	finally:
+		sys.path[:] = searchPath
+########################################################################
+def documentWorker(filePath, outputPath, cacheKey, cacheDirectory, cacheBytes):
+	'''
+	Write the documentation for a single file to outputPath, run in its
+	own worker process so a module that crashes or hangs the interpreter
+	while it is imported only fails its own page.
+	'''
+	enterWorkspace('docs')
+	page = documentModule(filePath)
+	if page == False:
+		return
+	pagePath = scratchPath(outputPath)
+	fileObject = open(pagePath, 'w')
+	fileObject.write(page)
+	fileObject.close()
+	# save the page so it is not generated again until the file changes
+	diskCache('docs', cacheDirectory, cacheBytes).putFile(cacheKey, pagePath)
+	moveFile(pagePath, outputPath)
+########################################################################
+def documentFiles(filePaths, outputDirectory, jobs, cacheDirectory=None, \
+		cacheBytes=500*1024*1024, timeout=None):
+	'''
+	Write pydoc documentation for every python file in filePaths into
+	outputDirectory. Pages for files that have not changed are copied
+	from the cache, the rest are generated by up to jobs worker processes
+	at once. Return a list of the files that failed.
+
+	Every file is imported in a worker process of its own, a worker that
+	dies or runs longer than timeout seconds only fails its own file.
+	'''
+	docsCache = diskCache('docs', cacheDirectory, cacheBytes)
+	work = list()
+	failed = list()
+	for filePath in filePaths:
+		fileHash = hashFile(filePath)
+		if fileHash == False:
+			# the file can not be read or is a broken link
+			failed.append(filePath)
+			continue
+		# the page has the name and path of the module in it and the
+		# python version changes the output of pydoc
+		cacheKey = hashKey('pydoc', fileHash, moduleName(filePath), \
+			filePath, sys.version)
+		outputPath = pathJoin(outputDirectory, moduleName(filePath)+'.html')
+		if docsCache.has(cacheKey):
+			linkFile(docsCache.path(cacheKey), outputPath)
+		else:
+			if pathExists(outputPath):
+				os.remove(outputPath)
+			work.append((filePath, outputPath, cacheKey, cacheDirectory, cacheBytes))
+	# each running worker with the time it must finish by
+	running = list()
+	while len(work) > 0 or len(running) > 0:
+		while len(work) > 0 and len(running) < max(1, jobs):
+			arguments = work.pop(0)
+			worker = Process(target=documentWorker, args=arguments)
+			worker.start()
+			deadline = None
+			if timeout != None:
+				deadline = default_timer() + timeout
+			running.append((worker, deadline, arguments[0], arguments[1]))
+		# wait for a worker to finish or the next deadline to pass
+		deadlines = [item[1] for item in running if item[1] != None]
+		waitTime = None
+		if len(deadlines) > 0:
+			waitTime = max(0, min(deadlines) - default_timer())
+		if waitForProcesses != None:
+			waitForProcesses([item[0].sentinel for item in running], waitTime)
+		else:
+			# join with a timeout sleeps instead of spinning
+			running[0][0].join(0.5 if waitTime == None else min(0.5, waitTime))
+		for item in list(running):
+			worker, deadline, filePath, outputPath = item
+			if worker.is_alive():
+				if deadline == None or default_timer() < deadline:
+					continue
+				# the import is taking too long
+				worker.terminate()
+			worker.join()
+			running.remove(item)
+			if not pathExists(outputPath):
+				failed.append(filePath)
+	docsCache.prune()
+	return failed
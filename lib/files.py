@@ -16,6 +16,30 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 ########################################################################
 import os
+from io import open as ioOpen
+from workspace import moveFile
+from workspace import scratchPath
+########################################################################
+# characters that must be escaped in html text and attribute values,
+# the ampersand must be first
+htmlEscapes = (
+	(u'&', u'&amp;'),
+	(u'<', u'&lt;'),
+	(u'>', u'&gt;'),
+	(u'"', u'&quot;'),
+	(u"'", u'&#39;')
+)
+########################################################################
+def escapeHTML(text):
+	'''
+	Escape text so it can be put in html, inside of a tag or inside of
+	a quoted attribute value.
+
+	:return string
+	'''
+	for character, replacement in htmlEscapes:
+		text = text.replace(character, replacement)
+	return text
 ########################################################################
 def loadFile(fileName):
 	'''
@@ -47,7 +71,9 @@ def loadFile(fileName):
 def saveFile(fileName,contentToWrite):
 	'''
 	Write the fileName path as a file containing the contentToWrite
-	string value.
+	string value. The content is written to a scratch file first and
+	moved over fileName so readers never see part of it. The file is
+	written as utf-8, on python 2 byte strings are decoded first.
 
 	:return bool
 	'''
@@ -57,9 +83,13 @@ def saveFile(fileName,contentToWrite):
 	filepath = os.sep.join(filepath)
 	# check if path exists
 	if os.path.exists(filepath):
-		fileObject = open(fileName,'w')
+		tempPath = scratchPath(fileName)
+		if isinstance(contentToWrite, bytes):
+			contentToWrite = contentToWrite.decode('utf-8', 'replace')
+		fileObject = ioOpen(tempPath,'w',encoding='utf-8')
 		fileObject.write(contentToWrite)
 		fileObject.close()
+		moveFile(tempPath,fileName)
 		return True
 	else:
 		print('Failed to write file, path:'+filepath+'does not exist!')
@@ -0,0 +1,176 @@
+########################################################################
+# Streaming reader for git repository history
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+from os.path import realpath
+from os.path import join as pathJoin
+from commandrunner import runCommand
+from commandrunner import streamLines
+########################################################################
+# every commit header in the log stream starts with the record separator
+# and has its fields split with the unit separator, neither of these
+# can start a line inside of the stats or the diff output
+commitMarker = '\x1e'
+fieldMarker = '\x1f'
+logFormat = '%x1e%H%x1f%h%x1f%P%x1f%an <%ae>%x1f%ad%x1f%s'
+# the longest line kept from the log stream, the rest of a longer line
+# such as a minified file in a diff is read and thrown away
+maxLineLength = 4096
+########################################################################
+def decodeLine(line):
+	'''
+	Convert a raw line read from the git process into a string without
+	the trailing newline.
+	'''
+	if isinstance(line, bytes):
+		line = line.decode('utf-8', 'replace')
+	return line.rstrip('\n')
+########################################################################
+def newCommit(header):
+	'''
+	Build a commit record from a header line of the log stream.
+
+	A commit record is a dict containing the keys sha, shortSha,
+	parents, author, date, message, stats, diff and omittedLines. The
+	stats and diff are lists of lines, omittedLines counts the diff
+	lines that were left out because the diff was too large.
+	'''
+	fields = header[len(commitMarker):].split(fieldMarker, 5)
+	# pad the fields in case git wrote a truncated header
+	fields += [''] * (6 - len(fields))
+	return {
+		'sha': fields[0],
+		'shortSha': fields[1],
+		'parents': fields[2].split(),
+		'author': fields[3],
+		'date': fields[4],
+		'message': fields[5],
+		'stats': [],
+		'diff': [],
+		'omittedLines': 0
+	}
+########################################################################
+def headCommit(directory='.'):
+	'''
+	Return the full sha of HEAD or False if the repository has no
+	commits.
+	'''
+	result = runCommand(['git', 'rev-parse', '--verify', '-q', 'HEAD'], \
+		cwd=directory)
+	output = result.output.strip()
+	if not result.succeeded() or output == '':
+		return False
+	return output
+########################################################################
+def gitDirectory(directory='.'):
+	'''
+	Return the absolute path of the git directory of the repository in
+	directory or False if it is not a git repository.
+	'''
+	result = runCommand(['git', 'rev-parse', '--git-dir'], cwd=directory, \
+		hideErrors=True)
+	output = result.output.strip()
+	if not result.succeeded() or output == '':
+		return False
+	return realpath(pathJoin(directory, output))
+########################################################################
+def isAncestor(ancestor, descendant, directory='.'):
+	'''
+	Return True if the ancestor commit is reachable from descendant. A
+	False value means history has been rewritten or the ancestor no
+	longer exists.
+	'''
+	return runCommand(['git', 'merge-base', '--is-ancestor', ancestor, \
+		descendant], cwd=directory, hideErrors=True).succeeded()
+########################################################################
+def countCommits(directory='.', revisions=('HEAD',)):
+	'''
+	Return the number of commits reachable from revisions.
+	'''
+	result = runCommand(['git', 'rev-list', '--count'] + list(revisions), \
+		cwd=directory)
+	output = result.output.strip()
+	if not result.succeeded() or not output.isdigit():
+		return 0
+	return int(output)
+########################################################################
+def mergeDiffOptions(directory='.'):
+	'''
+	Return the options that make "git log" show the diff of a merge
+	commit against its first parent, the same as "git diff sha^ sha".
+	Older versions of git do not support this and show no diff for
+	merges.
+	'''
+	result = runCommand(['git', 'log', '-1', '--diff-merges=first-parent', \
+		'--format='], cwd=directory, hideErrors=True)
+	if result.succeeded():
+		return ['--diff-merges=first-parent']
+	return []
+########################################################################
+def readHistory(directory='.', revisions=('HEAD',), maxDiffLines=None):
+	'''
+	Generator yielding a commit record for every commit selected by
+	revisions, newest first, the same order as "git log". Revisions can
+	be anything "git log" accepts e.g. a range like "old..HEAD" or
+	"--no-walk=unsorted" followed by a list of commits.
+
+	The whole history is read from a single "git log -p --stat" process
+	and parsed as it streams so only one commit is held in memory at a
+	time. If maxDiffLines is set only that many lines of each diff are
+	kept and the rest are counted in omittedLines. Root commits are shown
+	against the empty tree and merges against their first parent.
+
+	commandError is raised if "git log" fails or is killed before the
+	whole history is read.
+	'''
+	lines = streamLines(['git', 'log', '-p', '--stat', '--format='+logFormat] + \
+		mergeDiffOptions(directory) + list(revisions), maxLength=maxLineLength, \
+		cwd=directory)
+	commit = None
+	# section is one of header, stats or diff
+	section = 'header'
+	for line in lines:
+		line = decodeLine(line)
+		if line.startswith(commitMarker):
+			# a new header means the previous commit is complete
+			if commit is not None:
+				yield commit
+			commit = newCommit(line)
+			section = 'header'
+		elif commit is None:
+			# ignore anything git writes before the first commit
+			continue
+		elif section == 'header':
+			if line == '---':
+				# the stats follow the separator line
+				section = 'stats'
+			elif line.startswith('diff '):
+				# commits without stats go straight into the diff
+				section = 'diff'
+		elif section == 'stats':
+			if line == '':
+				# a blank line ends the stats block
+				section = 'diff'
+				continue
+			commit['stats'].append(line)
+		if section == 'diff':
+			if maxDiffLines == None or len(commit['diff']) < maxDiffLines:
+				commit['diff'].append(line)
+			else:
+				commit['omittedLines'] += 1
+	# yield the last commit in the stream
+	if commit is not None:
+		yield commit
@@ -0,0 +1,253 @@
+########################################################################
+# Render the gource video of the repository history
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+import time
+from shutil import rmtree
+from tempfile import mkdtemp
+from os.path import dirname
+from os.path import exists as pathExists
+from os.path import join as pathJoin
+from multiprocessing.pool import ThreadPool
+from commandrunner import findProgram
+from commandrunner import runCommand
+from commandrunner import runPipeline
+from diskcache import diskCache
+from diskcache import hashKey
+from githistory import headCommit
+from workspace import linkFile
+from workspace import moveFile
+from workspace import removeWorkspace
+from workspace import scratchPath
+########################################################################
+# the video settings for each preset, quality is the crf of the x264
+# encoder where lower is better and larger
+videoPresets = {
+	'high': {'resolution': '1280x720', 'fps': 60, 'quality': 1},
+	'medium': {'resolution': '1280x720', 'fps': 30, 'quality': 23},
+	'low': {'resolution': '640x360', 'fps': 25, 'quality': 30}
+}
+# gource can only write frames at these rates
+frameRates = (25, 30, 60)
+# the options gource is always run with, with -s 1 every day of history
+# is one second of video
+gourceOptions = ['--key', '--max-files', '0', '-s', '1', '-c', '4']
+secondsPerDay = 24*60*60
+########################################################################
+def findEncoder():
+	'''
+	Return the name of the installed video encoder, ffmpeg or avconv, or
+	False if neither is installed.
+	'''
+	for encoder in ('ffmpeg', 'avconv'):
+		if findProgram(encoder):
+			return encoder
+	return False
+########################################################################
+def videoSettings(preset='high', resolution=None, fps=None, quality=None, segments=None):
+	'''
+	Return the settings of a preset with any of the given settings used
+	in place of the preset values.
+	'''
+	settings = dict(videoPresets[preset])
+	# without a number of segments there is one for each core
+	settings['segments'] = None
+	if segments != None:
+		settings['segments'] = max(1, segments)
+	if resolution != None:
+		settings['resolution'] = resolution
+	if fps != None:
+		# use the closest frame rate gource supports
+		settings['fps'] = min(frameRates, key=lambda rate: abs(rate - fps))
+	if quality != None:
+		settings['quality'] = quality
+	return settings
+########################################################################
+def gourceCommand(settings, startDate=None, stopDate=None):
+	'''
+	Return the gource command that writes the frames of the video to
+	stdout, only the history between startDate and stopDate is shown if
+	they are given.
+	'''
+	command = ['gource'] + gourceOptions + ['-'+settings['resolution'], \
+		'--output-framerate', str(settings['fps']), '-o', '-']
+	if startDate != None:
+		command += ['--start-date', startDate]
+	if stopDate != None:
+		command += ['--stop-date', stopDate]
+	return command
+########################################################################
+def encoderCommand(encoder, settings, jobs, outputPath):
+	'''
+	Return the encoder command that reads the frames from stdin and
+	writes the video to outputPath.
+	'''
+	return [encoder, '-y', '-r', str(settings['fps']), '-f', 'image2pipe', \
+		'-vcodec', 'ppm', '-i', '-', '-vcodec', 'libx264', '-preset', 'ultrafast', \
+		'-pix_fmt', 'yuv420p', '-crf', str(settings['quality']), '-threads', str(jobs), \
+		'-bf', '0', outputPath]
+########################################################################
+def historyTimes(directory):
+	'''
+	Return the sorted commit times of every commit in the repository in
+	directory as unix timestamps, or False if there are no commits.
+	'''
+	result = runCommand(['git', 'log', '--format=%ct'], cwd=directory, hideErrors=True)
+	times = sorted(int(line) for line in result.output.split() if line.isdigit())
+	if not result.succeeded() or len(times) == 0:
+		return False
+	return times
+########################################################################
+def segmentDates(commitTimes, segments):
+	'''
+	Split the history of the sorted commitTimes into segments of the same
+	length. Return a list of the start and stop dates of each segment in
+	the format gource uses, the first segment has no start date and the
+	last segment has no stop date so no commits are left out.
+
+	A segment stops at the same date the next segment starts, so every
+	date is moved to a second without a commit. Whether gource includes
+	a commit at the date or not every commit is then in one segment.
+	'''
+	firstTime = commitTimes[0]
+	lastTime = commitTimes[-1]
+	# a segment shorter than a day would be less than a second of video
+	segments = max(1, min(segments, int((lastTime - firstTime) // secondsPerDay)))
+	length = (lastTime - firstTime) / float(segments)
+	usedTimes = set(commitTimes)
+	boundaries = list()
+	for index in range(1, segments):
+		boundary = firstTime + int(length * index)
+		while boundary in usedTimes:
+			boundary += 1
+		boundaries.append(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(boundary)))
+	starts = [None] + boundaries
+	stops = boundaries + [None]
+	return list(zip(starts, stops))
+########################################################################
+def renderSegment(arguments):
+	'''
+	Render a single segment of the video, used by the thread pool.
+	Return True if the segment was written.
+
+	arguments is a tuple of the repository directory, the segment
+	dates, the encoder, the settings, the encoder threads, the output
+	path and the debug object.
+	'''
+	directory, dates, encoder, settings, threads, outputPath, debug = arguments
+	startDate, stopDate = dates
+	# rendering takes as long as the history is, so the default timeout
+	# of a command is not used
+	result = runPipeline([gourceCommand(settings, startDate, stopDate), \
+		encoderCommand(encoder, settings, threads, outputPath)], timeout=0, \
+		cwd=directory, debug=debug)
+	return result.succeeded() and pathExists(outputPath)
+########################################################################
+def joinVideos(encoder, segmentPaths, outputPath, workDirectory, debug=None):
+	'''
+	Join the segment videos into one video without encoding them again.
+	Return True if the video was written.
+	'''
+	listPath = pathJoin(workDirectory, 'segments.txt')
+	fileObject = open(listPath, 'w')
+	for segmentPath in segmentPaths:
+		fileObject.write("file '"+segmentPath.replace("'", "'\\''")+"'\n")
+	fileObject.close()
+	# the encoder reads commands from stdin when it is not given input
+	inputFile = open(os.devnull, 'rb')
+	result = runCommand([encoder, '-y', '-f', 'concat', '-safe', '0', '-i', listPath, \
+		'-c', 'copy', outputPath], inputFile=inputFile, debug=debug)
+	inputFile.close()
+	return result.succeeded() and pathExists(outputPath)
+########################################################################
+def renderSegments(directory, outputPath, encoder, settings, jobs, debug=None):
+	'''
+	Render the video as segments of the history and join them. Every
+	segment is a gource and encoder pipeline, up to jobs of them are run
+	at once. Return True if the video was written.
+
+	Each segment is a separate gource run, so the camera, the files and
+	the users shown start over at every join. This is accepted for the
+	speed up, a single segment gives one unbroken video.
+	'''
+	commitTimes = historyTimes(directory)
+	if commitTimes == False:
+		return False
+	dates = segmentDates(commitTimes, settings['segments'])
+	if len(dates) == 1:
+		# a single segment is written straight to the output
+		return renderSegment((directory, dates[0], encoder, settings, jobs, \
+			outputPath, debug))
+	# the segments are written to a private directory of this stage
+	workDirectory = mkdtemp(prefix='gource-')
+	try:
+		# the cores left over when there are more cores than segments are
+		# given to the encoders
+		threads = max(1, jobs // len(dates))
+		work = list()
+		for index, segment in enumerate(dates):
+			segmentPath = pathJoin(workDirectory, 'segment-'+str(index)+'.mp4')
+			work.append((directory, segment, encoder, settings, threads, segmentPath, debug))
+		# the work is done by the commands so threads are enough
+		pool = ThreadPool(max(1, min(jobs, len(work))))
+		written = pool.map(renderSegment, work)
+		pool.close()
+		pool.join()
+		if False in written:
+			return False
+		return joinVideos(encoder, [item[5] for item in work], outputPath, \
+			workDirectory, debug)
+	finally:
+		rmtree(workDirectory)
+########################################################################
+def renderVideo(directory, outputPath, encoder, settings, jobs=1, \
+		cacheDirectory=None, cacheBytes=500*1024*1024, debug=None):
+	'''
+	Render the gource video of the repository in directory to
+	outputPath with the encoder and settings given. The history is split
+	into the number of segments in the settings, or into jobs segments
+	if it is not set, and jobs of them are rendered at the same time.
+
+	The video is rendered in a scratch file and moved to outputPath when
+	it is finished. It is cached by HEAD, the encoder and the settings
+	so it is only rendered again when there is a new commit. Return True
+	if the video was written.
+	'''
+	head = headCommit(directory)
+	if head == False:
+		# there is no history to render
+		return False
+	if settings['segments'] == None:
+		# a single core renders one unbroken video
+		settings = dict(settings, segments=max(1, jobs))
+	videoCache = diskCache('video', cacheDirectory, cacheBytes)
+	# the segments are part of the key since the joins show in the video
+	cacheKey = hashKey('gource', head, encoder, ' '.join(gourceOptions), \
+		settings['resolution'], str(settings['fps']), str(settings['quality']), \
+		str(settings['segments']))
+	if videoCache.has(cacheKey):
+		linkFile(videoCache.path(cacheKey), outputPath)
+		return True
+	renderPath = scratchPath(outputPath)
+	if not renderSegments(directory, renderPath, encoder, settings, jobs, debug):
+		# the video is incomplete so it is not kept
+		removeWorkspace(dirname(renderPath))
+		return False
+	videoCache.putFile(cacheKey, renderPath)
+	videoCache.prune()
+	moveFile(renderPath, outputPath)
+	return True
@@ -0,0 +1,160 @@
+########################################################################
+# Inventory of the source files in a project shared by all stages
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+from commandrunner import runCommand
+from workspace import workspacePrefix
+from os.path import realpath
+from os.path import splitext
+from os.path import join as pathJoin
+########################################################################
+# directories that never contain project sources, they are skipped
+# before they are searched
+prunedDirectories = set(['.git', '.hg', '.svn', 'node_modules', '__pycache__'])
+# directories only skipped at the top of the project, the report is
+# generated inside of the project directory
+prunedTopDirectories = set(['report'])
+########################################################################
+def isPrunedTop(name):
+	'''
+	Return True if the directory name is skipped at the top of the
+	project, the report and the workspaces of running reports.
+	'''
+	return name in prunedTopDirectories or name.startswith(workspacePrefix)
+########################################################################
+def walkFiles(directory, ignoreList=()):
+	'''
+	Generator yielding the absolute path of every file below directory.
+	Pruned and ignored directories are removed before they are searched.
+	'''
+	directory = realpath(directory)
+	# os.walk() uses os.scandir() so the file types come from the
+	# directory listing without a stat for every entry
+	for root, directories, files in os.walk(directory):
+		keptDirectories = list()
+		for name in directories:
+			if name in prunedDirectories:
+				continue
+			if root == directory and isPrunedTop(name):
+				continue
+			if isIgnored(pathJoin(root, name), ignoreList):
+				continue
+			keptDirectories.append(name)
+		# changing the list in place stops os.walk() from going deeper
+		directories[:] = keptDirectories
+		for name in files:
+			yield pathJoin(root, name)
+########################################################################
+def gitFiles(directory):
+	'''
+	Return the absolute paths of the files git knows about in directory,
+	tracked files and untracked files that are not ignored. Return False
+	if directory is not a git repository or git is not installed.
+	'''
+	directory = realpath(directory)
+	listedFiles = listGitFiles(directory, ['--cached', '--others', '--exclude-standard'])
+	if listedFiles == False:
+		return False
+	# files deleted from the working tree are still in the index
+	deletedFiles = set(listGitFiles(directory, ['--deleted']) or [])
+	paths = list()
+	for path in listedFiles:
+		if path in deletedFiles:
+			continue
+		parts = path.split('/')
+		# git lists files in pruned directories that are not ignored
+		if isPrunedTop(parts[0]) or prunedDirectories.intersection(parts):
+			continue
+		paths.append(pathJoin(directory, path))
+	return paths
+########################################################################
+def listGitFiles(directory, options):
+	'''
+	Return the paths relative to directory listed by "git ls-files" with
+	options or False if it fails.
+	'''
+	result = runCommand(['git', 'ls-files', '-z'] + options, cwd=directory, \
+		hideErrors=True)
+	if not result.succeeded():
+		return False
+	return [path for path in result.output.split('\0') if path != '']
+########################################################################
+def isIgnored(location, ignoreList):
+	'''
+	Return True if any item of the ignore list is found in location.
+	'''
+	for ignoreItem in ignoreList:
+		if ignoreItem in location:
+			return True
+	return False
+########################################################################
+class sourceInventory():
+	'''
+	An inventory of every file in a project built once per run.
+
+	The file list comes from "git ls-files" when the project is a git
+	repository and from walking the directory otherwise. Files are
+	indexed by extension so each stage can read the files it needs.
+	'''
+	def __init__(self, directory, ignoreList=None):
+		self.directory = realpath(directory)
+		if ignoreList == None:
+			ignoreList = list()
+		self.ignoreList = ignoreList
+		self.scan()
+	def scan(self):
+		'''
+		Build the inventory of the project files.
+		'''
+		paths = gitFiles(self.directory)
+		if paths == False:
+			paths = walkFiles(self.directory, self.ignoreList)
+		self.files = set()
+		self.extensions = dict()
+		for path in paths:
+			if path in self.files or isIgnored(path, self.ignoreList):
+				continue
+			self.files.add(path)
+			extension = splitext(path)[1]
+			if extension not in self.extensions:
+				self.extensions[extension] = list()
+			self.extensions[extension].append(path)
+		# keep the order of the files the same between runs
+		for extension in self.extensions:
+			self.extensions[extension].sort()
+	def find(self, sourceExtension):
+		'''
+		Return the list of files with the extension sourceExtension, which
+		is a string in the form of ".py".
+		'''
+		if not sourceExtension.startswith('.'):
+			sourceExtension = '.'+sourceExtension
+		return list(self.extensions.get(sourceExtension, list()))
+	def stamp(self, sourceExtension):
+		'''
+		Return the size and modification time of every file with the
+		extension sourceExtension, the stamp changes when any of the
+		files are changed, added or removed.
+		'''
+		stamps = list()
+		for path in self.find(sourceExtension):
+			try:
+				info = os.stat(path)
+			except OSError:
+				continue
+			stamps.append((path, info.st_size, info.st_mtime))
+		return stamps
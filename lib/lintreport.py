@@ -0,0 +1,170 @@
+########################################################################
+# Run pylint with structured output and build the lint report from it
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import ast
+import json
+from commandrunner import runCommand
+from files import escapeHTML
+from os.path import realpath
+from multiprocessing import Pool
+########################################################################
+# the message types used by the pylint rating formula
+messageTypes = ('fatal', 'error', 'warning', 'refactor', 'convention', 'info')
+########################################################################
+def countStatements(filePath):
+	'''
+	Count the statements in a python file the way pylint does for its
+	rating. Return 0 if the file can not be parsed.
+	'''
+	try:
+		fileObject = open(filePath, 'rb')
+		source = fileObject.read()
+		fileObject.close()
+		tree = ast.parse(source, filePath)
+	except (IOError, SyntaxError, ValueError, TypeError):
+		return 0
+	statements = 0
+	for node in ast.walk(tree):
+		if isinstance(node, ast.stmt):
+			statements += 1
+	return statements
+########################################################################
+def lintShard(arguments):
+	'''
+	Run a single pylint process with json output over a list of files.
+	Return a dict mapping each of the given paths to the list of
+	messages pylint found in it and True if pylint failed, crashed or
+	was killed, then every file only has a fatal pylint-failed message.
+
+	arguments is a tuple of the config path and the list of files so
+	this can be used with Pool.map().
+	'''
+	configPath, filePaths = arguments
+	results = dict()
+	# pylint may report a file by another path than it was given, so the
+	# messages are matched back to the given paths by their real path
+	givenPaths = dict()
+	for filePath in filePaths:
+		results[filePath] = list()
+		givenPaths.setdefault(realpath(filePath), list()).append(filePath)
+	result = runCommand(['pylint', '-f', 'json', '--include-naming-hint=y', \
+		'--rcfile='+configPath] + list(filePaths), hideErrors=True)
+	try:
+		if result.timedOut:
+			raise ValueError('pylint timed out')
+		messages = json.loads(result.output)
+	except (ValueError, TypeError):
+		# pylint crashed or printed no json, every file gets a fatal error
+		for filePath in filePaths:
+			results[filePath].append({
+				'type': 'fatal',
+				'line': 0,
+				'column': 0,
+				'obj': '',
+				'symbol': 'pylint-failed',
+				'message-id': 'F0000',
+				'message': 'pylint did not produce any output for this file'
+			})
+		return (results, True)
+	for message in messages:
+		for filePath in givenPaths.get(realpath(message.get('path', '')), ()):
+			results[filePath].append(message)
+	return (results, False)
+########################################################################
+def lintFiles(filePaths, configPath, jobs):
+	'''
+	Lint all of filePaths with pylint split across jobs worker processes.
+	Return a dict mapping each of filePaths to a lint result.
+
+	A lint result is a dict containing the messages found in the file,
+	the number of statements in the file and if pylint failed on it.
+	'''
+	filePaths = list(filePaths)
+	if len(filePaths) == 0:
+		return dict()
+	jobs = max(1, min(jobs, len(filePaths)))
+	# deal the files out to the shards so large directories are spread out
+	shards = [(configPath, filePaths[index::jobs]) for index in range(jobs)]
+	if jobs > 1:
+		pool = Pool(jobs)
+		shardResults = pool.map(lintShard, shards)
+		pool.close()
+		pool.join()
+	else:
+		shardResults = [lintShard(shards[0])]
+	results = dict()
+	for shardResult, failed in shardResults:
+		for path, messages in shardResult.items():
+			results[path] = {
+				'messages': messages,
+				'statements': countStatements(path),
+				'failed': failed
+			}
+	return results
+########################################################################
+def countMessages(lintResults):
+	'''
+	Count the messages of each type in a list of lint results.
+	'''
+	counts = dict((messageType, 0) for messageType in messageTypes)
+	for lintResult in lintResults:
+		for message in lintResult['messages']:
+			if message['type'] in counts:
+				counts[message['type']] += 1
+	return counts
+########################################################################
+def lintRating(lintResults):
+	'''
+	Return the pylint rating out of 10 for a list of lint results or
+	None if there are no statements to rate.
+	'''
+	counts = countMessages(lintResults)
+	statements = sum(lintResult['statements'] for lintResult in lintResults)
+	if counts['fatal'] > 0:
+		return 0.0
+	if statements == 0:
+		return None
+	# this is the evaluation formula pylint uses
+	weightedMessages = 5 * counts['error'] + counts['warning'] + \
+		counts['refactor'] + counts['convention']
+	return 10.0 - ((float(weightedMessages) / statements) * 10)
+########################################################################
+def renderMessages(lintResult):
+	'''
+	Render the messages of a lint result as a html table.
+	'''
+	rating = lintRating([lintResult])
+	output = '<div>'+str(lintResult['statements'])+' statements analysed.</div>\n'
+	if rating != None:
+		output += '<div>Your code has been rated at '+('%.2f' % rating)+'/10</div>\n'
+	if len(lintResult['messages']) == 0:
+		return output
+	output += '<table>\n'
+	output += '<tr><th>Line</th><th>Type</th><th>Symbol</th><th>Object</th><th>Message</th></tr>\n'
+	# sort the messages by where they are in the file
+	messages = sorted(lintResult['messages'], \
+		key=lambda message: (message.get('line', 0), message.get('column', 0)))
+	for message in messages:
+		output += '<tr class="'+escapeHTML(message.get('type', ''))+'">'
+		output += '<td>'+str(message.get('line', ''))+'</td>'
+		output += '<td>'+escapeHTML(message.get('type', ''))+'</td>'
+		output += '<td>'+escapeHTML(message.get('symbol', '')+' ('+message.get('message-id', '')+')')+'</td>'
+		output += '<td>'+escapeHTML(message.get('obj', ''))+'</td>'
+		output += '<td>'+escapeHTML(message.get('message', ''))+'</td>'
+		output += '</tr>\n'
+	output += '</table>\n'
+	return output
@@ -0,0 +1,222 @@
+########################################################################
+# Render the pages of the git log report
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+from io import open as ioOpen
+from os.path import exists as pathExists
+from os.path import join as pathJoin
+from multiprocessing import Pool
+from diffrender import renderDiff
+from files import escapeHTML
+from workspace import copyFile
+from workspace import moveFile
+from workspace import scratchPath
+########################################################################
+# the version of the pages the log is written as, the whole log is
+# rendered again when it changes
+logFormat = 2
+# each diff is a page of its own so it can be shown in a frame when the
+# log page is opened as a local file and the diff can not be requested,
+# the page tells the log page its height so the frame fits the diff
+diffPageHeader = u'''<html>
+<head>
+<meta charset='utf-8'>
+<link rel='stylesheet' href='../style.css'>
+</head>
+<body class='diff'>
+'''
+diffPageFooter = u'''<script>
+window.addEventListener('load', function(){
+	if (window.parent != window){
+		window.parent.postMessage({'diffHeight': document.documentElement.scrollHeight}, '*');
+	}
+});
+</script>
+</body>
+</html>
+'''
+########################################################################
+def decodeText(text):
+	'''
+	Return text as unicode, the log pages are written with io.open()
+	which only takes unicode on python 2.
+	'''
+	if isinstance(text, bytes):
+		return text.decode('utf-8')
+	return text
+########################################################################
+def renderCommit(commit, logFile, logDirectory):
+	'''
+	Render a commit record from readHistory() as html and write it to
+	the open log page logFile one line at a time. The diff is written to
+	its own file in logDirectory/diff/.
+	'''
+	# pull the commit message
+	commitMessage = commit['message']
+	# start building the commit specific html
+	logFile.write(u"<hr />\n")
+	logFile.write(u"<button class='button' style='width: 100%;' onclick='toggle(\""+commit['shortSha']+"\");return false;'>\n")
+	logFile.write(u"<h2 id='"+commitMessage.replace(' ','_')+"' >"+commitMessage+"</h2>\n")
+	logFile.write(u"</button>\n")
+	# generate the stats for the commit
+	logFile.write(u'<code><pre>\n')
+	logFile.write(escapeHTML(u'commit '+commit['sha']+'\n'))
+	logFile.write(escapeHTML(u'Author: '+commit['author']+'\n'))
+	logFile.write(escapeHTML(u'Date:   '+commit['date']+'\n\n'))
+	for line in commit['stats']:
+		logFile.write(escapeHTML(line)+u'\n')
+	logFile.write(u'</pre></code>\n')
+	logFile.write(u"<div id='"+commit['shortSha']+"' class='diff' style='display: none;' data-diff='diff/"+commit['sha']+".html'>\n")
+	logFile.write(u'<hr />\n')
+	logFile.write(u"<div class='diffContent'></div>\n")
+	# the diff is written to its own file and loaded when it is opened
+	diffPath = pathJoin(logDirectory, 'diff', commit['sha']+'.html')
+	diffScratch = scratchPath(diffPath)
+	diffFile = ioOpen(diffScratch, 'w', encoding='utf-8')
+	diffFile.write(diffPageHeader)
+	diffFile.write(renderDiff(commit['diff'], commit['omittedLines']))
+	diffFile.write(diffPageFooter)
+	diffFile.close()
+	moveFile(diffScratch, diffPath)
+	logFile.write(u"<a class='button' style='display: inline-block;width: 100%;' href='#"+commitMessage.replace(' ','_'))
+	logFile.write(u"' onclick='toggle(\""+commit['shortSha']+"\");return true;'>\n")
+	logFile.write(u"Close Diff\n")
+	logFile.write(u"</a>\n")
+	logFile.write(u'</div>\n')
+########################################################################
+def logPageLinks(page, pages, window):
+	'''
+	Generate the navigation links for a page of the git log. Only the
+	pages within window of the page are linked along with the newest
+	and oldest pages.
+	'''
+	pageLinks = u"<!-- pageLinks -->\n"
+	pageLinks += u"<div class='pageLinks'>\n"
+	# the newest page is always log.html so the link never changes
+	pageLinks += u"<a href='log.html'>Newest</a>\n"
+	firstPage = min(pages, page + window)
+	lastPage = max(1, page - window)
+	if firstPage < pages - 1:
+		pageLinks += u"...\n"
+	# link the pages near this page, newest page first
+	for linkPage in range(firstPage, lastPage - 1, -1):
+		if linkPage == page:
+			pageLinks += u"<b>"+str(linkPage)+"</b>\n"
+		else:
+			pageLinks += u"<a href='log"+str(linkPage)+".html'>"+str(linkPage)+"</a>\n"
+	if lastPage > 2:
+		pageLinks += u"...\n"
+	pageLinks += u"<a href='log1.html'>Oldest</a>\n"
+	pageLinks += u"</div>\n"
+	pageLinks += u"<!-- /pageLinks -->\n"
+	return pageLinks
+########################################################################
+def writeLogPage(logDirectory, page, pages, window, header, commits):
+	'''
+	Write a page of the git log containing the commit records in commits,
+	newest first. The newest page is also saved as the main log page.
+
+	This only depends on its arguments so pages can be written by
+	separate worker processes.
+	'''
+	pagePath = pathJoin(logDirectory, 'log'+str(page)+'.html')
+	# the page is written to a scratch file, the page it replaces may
+	# be linked from the previous report
+	pageScratch = scratchPath(pagePath)
+	logFile = ioOpen(pageScratch, 'w', encoding='utf-8')
+	logFile.write(decodeText(header))
+	logFile.write(logPageLinks(page, pages, window))
+	for commit in commits:
+		# commits are written to the page as they are rendered
+		renderCommit(commit, logFile, logDirectory)
+	logFile.write(logPageLinks(page, pages, window))
+	logFile.write(u"</body>\n")
+	logFile.write(u"</html>\n")
+	logFile.close()
+	moveFile(pageScratch, pagePath)
+	if page == pages:
+		# save the newest page as the main log page
+		copyFile(pagePath, pathJoin(logDirectory, 'log.html'))
+	return page
+########################################################################
+def updateLogPageLinks(logDirectory, page, pages, window):
+	'''
+	Replace the navigation links in a previously written log page.
+	'''
+	pagePath = pathJoin(logDirectory, 'log'+str(page)+'.html')
+	if not pathExists(pagePath):
+		return
+	logFile = ioOpen(pagePath, 'r', encoding='utf-8')
+	pageContent = logFile.read()
+	logFile.close()
+	start = u'<!-- pageLinks -->\n'
+	end = u'<!-- /pageLinks -->\n'
+	pageContent = pageContent.split(start)
+	for index in range(1, len(pageContent)):
+		# drop the old links up to the end marker
+		pageContent[index] = pageContent[index][pageContent[index].find(end)+len(end):]
+	pageScratch = scratchPath(pagePath)
+	logFile = ioOpen(pageScratch, 'w', encoding='utf-8')
+	logFile.write(logPageLinks(page, pages, window).join(pageContent))
+	logFile.close()
+	moveFile(pageScratch, pagePath)
+########################################################################
+class pageWriter():
+	'''
+	Write log pages with a pool of worker processes.
+
+	Pages are handed to the pool as they are filled and at most two
+	pages for each worker are waiting at once, so memory use does not
+	grow with the length of the history. With one job the pages are
+	written in this process.
+	'''
+	def __init__(self, jobs):
+		self.jobs = jobs
+		self.waiting = list()
+		if self.jobs > 1:
+			self.pool = Pool(self.jobs)
+		else:
+			self.pool = None
+	def write(self, *arguments):
+		'''
+		Write a page using the same arguments as writeLogPage().
+		'''
+		if self.pool == None:
+			writeLogPage(*arguments)
+			return
+		# wait for the oldest page if too many pages are waiting
+		while len(self.waiting) >= self.jobs * 2:
+			self.waiting.pop(0).get()
+		self.waiting.append(self.pool.apply_async(writeLogPage, arguments))
+	def close(self):
+		'''
+		Wait for all of the pages to be written.
+		'''
+		if self.pool == None:
+			return
+		for result in self.waiting:
+			# get() raises any error from the worker
+			result.get()
+		self.pool.close()
+		self.pool.join()
+	def terminate(self):
+		'''
+		Stop the workers without waiting for the pages to be written.
+		'''
+		if self.pool == None:
+			return
+		self.pool.terminate()
+		self.pool.join()
@@ -15,49 +15,164 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 ########################################################################
+import os
 import sys
+import json
+from time import time
+from collections import deque
+########################################################################
+# the levels of debug messages, only messages at or above the level set
+# on the command line are shown
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+levelNames = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+levelValues = dict((name, level) for level, name in levelNames.items())
+# messages are built as unicode on python 2 since command output is
+# decoded before it is logged
+if sys.version_info[0] < 3:
+	textType = unicode
+else:
+	textType = str
+########################################################################
+def toText(value):
+	'''
+	Convert value to text for a message, byte strings on python 2 are
+	decoded as utf-8.
+	'''
+	if isinstance(value, textType):
+		return value
+	if sys.version_info[0] < 3 and isinstance(value, str):
+		return value.decode('utf-8', 'replace')
+	return textType(value)
+########################################################################
+def printLine(line):
+	'''
+	Print a message, on python 2 the text is encoded for the terminal or
+	as utf-8 if the output is not a terminal.
+	'''
+	if sys.version_info[0] < 3:
+		line = line.encode(sys.stdout.encoding or 'utf-8', 'replace')
+	print(line)
+########################################################################
+def argumentValue(flag, default):
+	'''
+	Return the value given after flag on the command line or default if
+	the flag is not used.
+	'''
+	for index, argument in enumerate(sys.argv):
+		if argument.lower() == flag and index + 1 < len(sys.argv):
+			return sys.argv[index + 1]
+	return default
 ########################################################################
 class init():
 	'''
 	A master debuging object to handle all debugging output
 
-	If given a value of False debugging will be disabled.
-	e.g. "debug=masterDebug(False)"
+	Debugging is enabled with --debug, --debug-level can be set to one
+	of debug, info, warning or error to show less. Only the last
+	--debug-lines messages are kept for get() and display() and every
+	message is cut down to --debug-width characters. If --debug-file is
+	given every message is also appended to that file as a json line.
+
+	Messages are only formatted when they will be shown, so the content
+	can be a function that is called to build the message.
 	'''
 	def __init__(self):
 		# check if the --debug is set in the command line
-		if '--debug' in sys.argv:
-			self.debug = True
+		levelName = argumentValue('--debug-level', None)
+		if levelName != None:
+			self.level = levelValues.get(levelName.upper(), DEBUG)
+		elif '--debug' in sys.argv:
+			self.level = DEBUG
 		else:
-			self.debug = False
-		self.text=[]
+			# debug messages are hidden but warnings and errors are shown
+			self.level = WARNING
+		self.debug = self.level <= DEBUG
+		self.maxWidth = int(argumentValue('--debug-width', 500))
+		# only the newest messages are kept in memory
+		self.text = deque(maxlen=int(argumentValue('--debug-lines', 1000)))
+		self.logFile = argumentValue('--debug-file', None)
 		if self.debug==True:
 			self.banner(' PYTHON DEBUG ')
-	def add(self,title=None,content=None):
-		# check if debug is disabled
-		if self.debug==False:
+	def enabled(self, level):
+		'''
+		Return True if messages at level will be shown.
+		'''
+		return level >= self.level
+	def truncate(self, line):
+		'''
+		Cut a line down to the max width of a message.
+		'''
+		if len(line) > self.maxWidth:
+			return line[:self.maxWidth]+' ... ('+str(len(line)-self.maxWidth)+' more characters)'
+		return line
+	def log(self, level, title, content=None):
+		'''
+		Write a message at level. The content is only converted to a string
+		when the message is shown and if it is a function it is called to
+		build the content.
+		'''
+		# check if the level is disabled
+		if level < self.level:
 			return
+		if callable(content):
+			content = content()
 		# - All arguments given here are casted to strings
 		# if user gives two arguements the first is considered the title
-		if content!= None:
-			# append the content with a title
-			self.text.append(str(title)+' : '+str(content))
-			print(str(title)+' : '+str(content))
+		if content != None:
+			line = toText(title)+' : '+toText(content)
 		else:
-			# otherwise add the first argument as a debug line
-			self.text.append(str(title))
-			print(str(title))
-
+			line = toText(title)
+		line = self.truncate(line)
+		if level > DEBUG:
+			line = levelNames[level]+': '+line
+		self.text.append(line)
+		printLine(line)
+		if self.logFile != None:
+			self.writeRecord(level, line)
+	def writeRecord(self, level, line):
+		'''
+		Append a message to the log file as a json line. Every line is
+		written with a single write so messages from different processes
+		do not mix.
+		'''
+		record = json.dumps({'time': time(), 'pid': os.getpid(), \
+			'level': levelNames[level], 'message': line})
+		fileDescriptor = os.open(self.logFile, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+		os.write(fileDescriptor, (record+'\n').encode('utf-8'))
+		os.close(fileDescriptor)
+	def add(self,title=None,content=None):
+		'''
+		Write a debug message.
+		'''
+		self.log(DEBUG, title, content)
+	def info(self, title, content=None):
+		'''
+		Write an info message.
+		'''
+		self.log(INFO, title, content)
+	def warning(self, title, content=None):
+		'''
+		Write a warning message.
+		'''
+		self.log(WARNING, title, content)
+	def error(self, title, content=None):
+		'''
+		Write an error message.
+		'''
+		self.log(ERROR, title, content)
 	def get(self):
-		# return the text array
-		return self.text
+		# return the newest lines of the text
+		return list(self.text)
 	def banner(self,titleString=None):
 		# check if debug is disabled
 		if self.debug==False:
 			return
 		if titleString != None:
 			title=str(titleString)
-			edge='#'*((80-len(title))/2)
+			edge='#'*((80-len(title))//2)
 			print('#'*80)
 			print(edge+title+edge)
 			print('#'*80)
@@ -72,7 +187,6 @@ class init():
 		# write each line of the debug
 		for line in self.text:
 			# add debug to each line to use grep for error searching
-			print('DEBUG:'+str(line))
+			printLine('DEBUG:'+line)
 		# draw bottom divider
 		self.banner()
-
@@ -0,0 +1,214 @@
+########################################################################
+# Profile python scripts with cProfile and render the stats as html
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import pstats
+import cProfile
+from os.path import basename
+from os.path import realpath
+from files import escapeHTML
+from scriptrunner import prepareScript
+from scriptrunner import runMain
+from scriptrunner import runWorker
+from workspace import moveFile
+from workspace import scratchPath
+########################################################################
+# the columns of the profile table, each is the title, the position of
+# the value in the stats of a function and the names of the sort
+# methods that sort by it
+profileColumns = (
+	('ncalls', 1, ('ncalls', 'calls')),
+	('tottime', 2, ('tottime', 'time')),
+	('percall', None, ()),
+	('cumtime', 3, ('cumtime', 'cumulative')),
+	('percall', None, ()),
+	('filename:lineno(function)', None, ('filename', 'name', 'line'))
+)
+# sort the table by clicking on a column header
+sortScript = '''<script>
+function sortProfile(header){
+	var table = header.parentNode.parentNode;
+	var column = Array.prototype.indexOf.call(header.parentNode.children, header);
+	var rows = Array.prototype.slice.call(table.rows, 1);
+	var descending = header.getAttribute('data-descending') != 'true';
+	header.setAttribute('data-descending', descending);
+	rows.sort(function(first, second){
+		var a = first.cells[column].getAttribute('data-value');
+		var b = second.cells[column].getAttribute('data-value');
+		var order = isNaN(a) ? (a < b ? -1 : (a > b ? 1 : 0)) : a - b;
+		return descending ? -order : order;
+	});
+	for (var index = 0; index < rows.length; index++){
+		table.appendChild(rows[index]);
+	}
+}
+</script>
+'''
+########################################################################
+def runProfile(filePath, profilePath):
+	'''
+	Run the python script at filePath as __main__ under cProfile and save
+	the stats to profilePath. This runs inside of the worker process.
+	'''
+	prepareScript(filePath, 'profile')
+	profile = cProfile.Profile()
+	profile.runcall(runMain, filePath)
+	statsPath = scratchPath(profilePath)
+	profile.dump_stats(statsPath)
+	moveFile(statsPath, profilePath)
+########################################################################
+def profileWorker(filePath, profilePath):
+	'''
+	Return the worker that profiles the python script at filePath and
+	saves the stats to profilePath, for runWorkers().
+	'''
+	return (runProfile, (filePath, profilePath), profilePath)
+########################################################################
+def profileScript(filePath, profilePath, timeout=None):
+	'''
+	Profile the python script at filePath in a worker process so the
+	script can not change the state of the report. The stats are saved
+	to profilePath. Return True if the profile was written.
+	'''
+	return runWorker(*profileWorker(filePath, profilePath), timeout=timeout)
+########################################################################
+def functionName(function):
+	'''
+	Return the name of a function in the stats the same way pstats
+	prints it.
+	'''
+	fileName, line, name = function
+	if fileName == '~' and line == 0:
+		# built in functions have no file
+		return name
+	return fileName+':'+str(line)+'('+name+')'
+########################################################################
+def renderProfile(profilePath, sortMethod='cumtime'):
+	'''
+	Render the stats saved in profilePath as a html table sorted by
+	sortMethod. The columns of the table can be sorted by clicking on
+	their headers.
+	'''
+	try:
+		stats = pstats.Stats(profilePath).stats
+	except (IOError, OSError, EOFError, ValueError, TypeError):
+		return '<p>No profile was recorded</p>\n'
+	position = 3
+	for title, index, sortNames in profileColumns:
+		if sortMethod in sortNames and index != None:
+			position = index
+	rows = list()
+	for function, (primitiveCalls, calls, totalTime, cumulativeTime, callers) in stats.items():
+		if primitiveCalls != calls:
+			# recursive calls are shown as total/primitive
+			callText = str(calls)+'/'+str(primitiveCalls)
+		else:
+			callText = str(calls)
+		if sortMethod in ('filename', 'name', 'line'):
+			sortValue = functionName(function)
+		else:
+			# the largest values come first
+			sortValue = -(calls, totalTime, cumulativeTime)[position - 1]
+		rows.append((sortValue, [
+			(calls, callText),
+			(totalTime, '%.3f' % totalTime),
+			(totalTime / calls if calls else 0, '%.3f' % (totalTime / calls if calls else 0)),
+			(cumulativeTime, '%.3f' % cumulativeTime),
+			(cumulativeTime / primitiveCalls if primitiveCalls else 0, \
+				'%.3f' % (cumulativeTime / primitiveCalls if primitiveCalls else 0)),
+			(functionName(function), functionName(function))
+		]))
+	rows.sort(key=lambda row: row[0])
+	table = sortScript
+	table += '<table>\n'
+	table += '\t<tr>\n'
+	for title, index, sortNames in profileColumns:
+		table += "\t\t<th onclick='sortProfile(this)' style='cursor: pointer;'>"+title+'</th>\n'
+	table += '\t</tr>\n'
+	for sortValue, cells in rows:
+		table += '\t<tr>\n'
+		for value, text in cells:
+			table += "\t\t<td data-value='"+escapeHTML(str(value))+"'>"
+			table += escapeHTML(text)+'</td>\n'
+		table += '\t</tr>\n'
+	table += '</table>\n'
+	return table
+########################################################################
+def callCount(callerStats):
+	'''
+	Return the number of calls from a caller in the stats, python 2
+	stores only the count and python 3 stores the full stats.
+	'''
+	if isinstance(callerStats, tuple):
+		return callerStats[1]
+	return callerStats
+########################################################################
+def graphRoots(stats, scriptPath):
+	'''
+	Return the functions the call graph starts from, the module level
+	code of the script or the functions nothing called if the script
+	can not be found.
+	'''
+	scriptPath = realpath(scriptPath)
+	roots = [function for function in stats \
+		if function[2] == '<module>' and realpath(function[0]) == scriptPath]
+	if len(roots) == 0:
+		roots = [function for function in stats if len(stats[function][4]) == 0]
+	return roots
+########################################################################
+def callGraph(profilePath, scriptPath, maxDepth=5):
+	'''
+	Build a graphviz call graph of the stats saved in profilePath. Only
+	functions within maxDepth calls of the script are shown. Each node
+	shows the calls and time of the function and is colored by the share
+	of the total time spent in it.
+	'''
+	stats = pstats.Stats(profilePath).stats
+	# find the callees of each function from the callers in the stats
+	callees = dict()
+	for function in stats:
+		for caller in stats[function][4]:
+			callees.setdefault(caller, list()).append(function)
+	# walk the calls breadth first to find the depth of each function
+	depths = dict((function, 0) for function in graphRoots(stats, scriptPath))
+	queue = list(depths)
+	for function in queue:
+		if depths[function] >= int(maxDepth):
+			continue
+		for callee in callees.get(function, ()):
+			if callee not in depths:
+				depths[callee] = depths[function] + 1
+				queue.append(callee)
+	totalTime = max([stats[function][3] for function in depths] + [1e-9])
+	numbers = dict((function, index) for index, function in enumerate(sorted(depths)))
+	graph = 'digraph calls {\n'
+	graph += '\tnode [shape=box, style=filled, fontname="sans"];\n'
+	for function in sorted(depths):
+		primitiveCalls, calls, ownTime, cumulativeTime, callers = stats[function]
+		share = cumulativeTime / totalTime
+		# the color goes from blue for fast functions to red for slow ones
+		color = '%.3f 0.6 0.9' % (0.6 - 0.6 * min(share, 1.0))
+		label = function[2]+'\\n'+basename(function[0])+':'+str(function[1])
+		label += '\\ncalls: '+str(calls)+'\\ntime: '+('%.3f' % cumulativeTime)+'s'
+		graph += '\tf'+str(numbers[function])+' [label="'+label.replace('"', '\\"')
+		graph += '", fillcolor="'+color+'"];\n'
+	for function in sorted(depths):
+		for caller, callerStats in stats[function][4].items():
+			if caller in numbers:
+				graph += '\tf'+str(numbers[caller])+' -> f'+str(numbers[function])
+				graph += ' [label="'+str(callCount(callerStats))+'"];\n'
+	graph += '}\n'
+	return graph
@@ -0,0 +1,305 @@
+########################################################################
+# Repository statistics built from a single pass over the git history
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import json
+import time
+from array import array
+from datetime import date
+from os.path import exists as pathExists
+from commandrunner import streamLines
+from files import escapeHTML
+from files import loadFile
+from files import saveFile
+from githistory import commitMarker
+from githistory import decodeLine
+from githistory import fieldMarker
+from githistory import headCommit
+from githistory import isAncestor
+########################################################################
+# the header of every commit in the stats stream, the numstat and
+# summary lines of the commit follow it
+statsFormat = '%x1e%H%x1f%at%x1f%ai%x1f%aN <%aE>'
+# the tables kept for each author and for each commit, every table is an
+# array of integers with one item per author or per commit
+authorTables = ('commits', 'added', 'removed', 'first', 'last')
+commitTables = ('times', 'lines', 'files')
+# the most points drawn in a chart, longer histories are sampled
+chartPoints = 500
+weekdayNames = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', \
+	'Saturday', 'Sunday')
+########################################################################
+class repoStats():
+	'''
+	Statistics of a git repository kept in arrays of integers.
+
+	Authors are numbered in the order they first commit and each author
+	table has one item per author. Each commit table has one item per
+	commit, oldest first, holding the commit time and the total lines
+	and files in the repository after the commit. The state can be
+	saved and loaded so only new commits are read on the next run.
+	'''
+	def __init__(self):
+		self.head = False
+		self.authors = list()
+		self.authorIndex = dict()
+		self.authorTables = dict((name, array('l')) for name in authorTables)
+		self.commitTables = dict((name, array('l')) for name in commitTables)
+		self.hours = array('l', [0] * 24)
+		self.weekdays = array('l', [0] * 7)
+		self.lineCount = 0
+		self.fileCount = 0
+		self.added = 0
+		self.removed = 0
+	def load(self, statePath):
+		'''
+		Load the state saved by the last run. Return False if there is no
+		usable state.
+		'''
+		if not pathExists(statePath):
+			return False
+		stateContent = loadFile(statePath)
+		if stateContent == False:
+			return False
+		try:
+			state = json.loads(stateContent)
+			self.head = state['head']
+			self.authors = state['authors']
+			self.authorIndex = dict((name, index) for index, name in enumerate(self.authors))
+			for name in authorTables:
+				self.authorTables[name] = array('l', state['authorTables'][name])
+			for name in commitTables:
+				self.commitTables[name] = array('l', state['commitTables'][name])
+			self.hours = array('l', state['hours'])
+			self.weekdays = array('l', state['weekdays'])
+			for name in ('lineCount', 'fileCount', 'added', 'removed'):
+				setattr(self, name, state[name])
+		except (ValueError, KeyError, TypeError):
+			# start over with empty tables
+			self.__init__()
+			return False
+		return True
+	def save(self, statePath):
+		'''
+		Save the state so the next run only needs to read new commits.
+		'''
+		saveFile(statePath, json.dumps({
+			'head': self.head,
+			'authors': self.authors,
+			'authorTables': dict((name, list(table)) for name, table in self.authorTables.items()),
+			'commitTables': dict((name, list(table)) for name, table in self.commitTables.items()),
+			'hours': list(self.hours),
+			'weekdays': list(self.weekdays),
+			'lineCount': self.lineCount,
+			'fileCount': self.fileCount,
+			'added': self.added,
+			'removed': self.removed
+		}))
+	def update(self, directory='.'):
+		'''
+		Read the commits made since the saved head. The whole history is
+		read again if there is no saved state or history was rewritten.
+		Return the number of commits read.
+
+		If "git log" fails commandError is raised and the head is left as
+		it was, the tables then only hold part of the new commits and must
+		not be saved.
+		'''
+		head = headCommit(directory)
+		if head == False:
+			return 0
+		if self.head == head:
+			return 0
+		if self.head != False and isAncestor(self.head, head, directory):
+			revisions = [self.head+'..'+head]
+		else:
+			self.__init__()
+			revisions = [head]
+		count = self.readCommits(directory, revisions)
+		self.head = head
+		return count
+	def readCommits(self, directory, revisions):
+		'''
+		Fold the commits selected by revisions into the tables, oldest
+		first, from a single "git log --numstat" process. Raise
+		commandError if the process fails before all of them are read.
+		'''
+		lines = streamLines(['git', 'log', '--reverse', '--numstat', '--summary', \
+			'--format='+statsFormat] + list(revisions), cwd=directory)
+		count = 0
+		author = None
+		for line in lines:
+			line = decodeLine(line)
+			if line.startswith(commitMarker):
+				if author != None:
+					self.finishCommit()
+				fields = line[len(commitMarker):].split(fieldMarker, 3)
+				if len(fields) < 4:
+					author = None
+					continue
+				author = self.addCommit(int(fields[1]), fields[2], fields[3])
+				count += 1
+			elif author == None or line == '':
+				continue
+			elif line.startswith(' create mode '):
+				self.fileCount += 1
+			elif line.startswith(' delete mode '):
+				self.fileCount -= 1
+			else:
+				parts = line.split('\t', 2)
+				if len(parts) == 3:
+					# binary files are listed with - for the line counts
+					added = int(parts[0]) if parts[0].isdigit() else 0
+					removed = int(parts[1]) if parts[1].isdigit() else 0
+					self.authorTables['added'][author] += added
+					self.authorTables['removed'][author] += removed
+					self.added += added
+					self.removed += removed
+					self.lineCount += added - removed
+		if author != None:
+			self.finishCommit()
+		return count
+	def addCommit(self, commitTime, localDate, author):
+		'''
+		Count a new commit and return the number of its author.
+		'''
+		if author not in self.authorIndex:
+			self.authorIndex[author] = len(self.authors)
+			self.authors.append(author)
+			for name in authorTables:
+				self.authorTables[name].append(0)
+			self.authorTables['first'][-1] = commitTime
+		index = self.authorIndex[author]
+		self.authorTables['commits'][index] += 1
+		self.authorTables['first'][index] = min(self.authorTables['first'][index], commitTime)
+		self.authorTables['last'][index] = max(self.authorTables['last'][index], commitTime)
+		# the hour and day come from the local time of the author
+		try:
+			day = date(int(localDate[0:4]), int(localDate[5:7]), int(localDate[8:10]))
+			self.weekdays[day.weekday()] += 1
+			self.hours[int(localDate[11:13])] += 1
+		except ValueError:
+			pass
+		self.commitTables['times'].append(commitTime)
+		return index
+	def finishCommit(self):
+		'''
+		Record the size of the repository after the last commit read.
+		'''
+		self.commitTables['lines'].append(self.lineCount)
+		self.commitTables['files'].append(self.fileCount)
+	def commits(self):
+		'''
+		Return the number of commits read.
+		'''
+		return len(self.commitTables['times'])
+########################################################################
+def formatTime(timestamp):
+	'''
+	Return a unix timestamp as a date string.
+	'''
+	return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+########################################################################
+def renderBars(labels, values):
+	'''
+	Render a table with a bar for each value.
+	'''
+	largest = max(max(values), 1)
+	table = "<table>\n"
+	for label, value in zip(labels, values):
+		table += "<tr><td>"+str(label)+"</td><td>"+str(value)+"</td><td>"
+		table += "<div style='background-color: green;height: 1em;width: "
+		table += str(int(300 * value / largest))+"px;'></div></td></tr>\n"
+	table += "</table>\n"
+	return table
+########################################################################
+def renderChart(times, values, width=800, height=200):
+	'''
+	Render values over time as a svg line chart. Long histories are
+	sampled down to chartPoints points.
+	'''
+	if len(times) == 0:
+		return "<p>No commits</p>\n"
+	step = max(1, len(times) // chartPoints)
+	indexes = list(range(0, len(times), step))
+	if indexes[-1] != len(times) - 1:
+		indexes.append(len(times) - 1)
+	firstTime = times[0]
+	timeSpan = max(times[-1] - firstTime, 1)
+	lowest = min(0, min(values))
+	valueSpan = max(max(values) - lowest, 1)
+	points = list()
+	for index in indexes:
+		x = width * (times[index] - firstTime) / float(timeSpan)
+		y = height - (height * (values[index] - lowest) / float(valueSpan))
+		points.append('%.1f,%.1f' % (x, y))
+	chart = "<svg width='"+str(width)+"' height='"+str(height)+"' style='border: 1px solid black;'>\n"
+	chart += "<polyline fill='none' stroke='green' stroke-width='2' points='"+' '.join(points)+"' />\n"
+	chart += "</svg>\n"
+	chart += "<div>"+formatTime(firstTime)+" to "+formatTime(times[-1])
+	chart += ", max "+str(max(values))+"</div>\n"
+	return chart
+########################################################################
+def renderStats(stats, style=''):
+	'''
+	Render the statistics as a html page.
+	'''
+	page = "<html>\n<head>\n"
+	if style != '':
+		page += "<style>\n"+style+"\n</style>\n"
+	page += "<style>\n"
+	page += "td{border-width:3px;border-style:solid;}\n"
+	page += "th{border-width:3px;border-style:solid;\n"
+	page += "color:white;background-color:black;}\n"
+	page += "</style>\n</head>\n<body>\n"
+	page += "<h1><a href='../index.html'>Back</a></h1>\n"
+	page += "<h2>General</h2>\n"
+	page += "<table>\n"
+	times = stats.commitTables['times']
+	general = [('Commits', stats.commits()), ('Authors', len(stats.authors)), \
+		('Files', stats.fileCount), ('Lines of code', stats.lineCount), \
+		('Lines added', stats.added), ('Lines removed', stats.removed)]
+	if len(times) > 0:
+		general += [('First commit', formatTime(min(times))), \
+			('Last commit', formatTime(max(times)))]
+	for label, value in general:
+		page += "<tr><th>"+label+"</th><td>"+str(value)+"</td></tr>\n"
+	page += "</table>\n"
+	page += "<h2>Lines of Code</h2>\n"
+	page += renderChart(times, stats.commitTables['lines'])
+	page += "<h2>Files</h2>\n"
+	page += renderChart(times, stats.commitTables['files'])
+	page += "<h2>Commits by Hour of Day</h2>\n"
+	page += renderBars(range(24), stats.hours)
+	page += "<h2>Commits by Day of Week</h2>\n"
+	page += renderBars(weekdayNames, stats.weekdays)
+	page += "<h2>Authors</h2>\n"
+	page += "<table>\n"
+	page += "<tr><th>Author</th><th>Commits</th><th>Percent</th><th>Lines added</th>"
+	page += "<th>Lines removed</th><th>First commit</th><th>Last commit</th></tr>\n"
+	tables = stats.authorTables
+	order = sorted(range(len(stats.authors)), key=lambda index: -tables['commits'][index])
+	for index in order:
+		page += "<tr><td>"+escapeHTML(stats.authors[index])+"</td>"
+		page += "<td>"+str(tables['commits'][index])+"</td>"
+		page += "<td>"+('%.1f' % (100.0 * tables['commits'][index] / max(stats.commits(), 1)))+"</td>"
+		page += "<td>"+str(tables['added'][index])+"</td>"
+		page += "<td>"+str(tables['removed'][index])+"</td>"
+		page += "<td>"+formatTime(tables['first'][index])+"</td>"
+		page += "<td>"+formatTime(tables['last'][index])+"</td></tr>\n"
+	page += "</table>\n"
+	page += "</body>\n</html>\n"
+	return page
@@ -0,0 +1,140 @@
+########################################################################
+# Run the stages of the report in dependency order on a cpu budget
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+from multiprocessing import Process
+try:
+	# block on the process sentinels when available
+	from multiprocessing.connection import wait as waitForProcesses
+except ImportError:
+	waitForProcesses = None
+########################################################################
+class stage():
+	'''
+	A single stage of the report run as its own process.
+
+	depends is a list of the names of stages that must finish before
+	this stage starts, stages with a higher priority are started first
+	and cores is the most cpu cores the stage can make use of.
+	'''
+	def __init__(self, name, target, args=(), depends=(), priority=0, cores=1):
+		self.name = name
+		self.target = target
+		self.args = tuple(args)
+		self.depends = list(depends)
+		self.priority = priority
+		self.cores = max(1, cores)
+		# the cores given to the stage when it was started
+		self.grantedCores = 0
+		self.process = None
+		self.exitCode = None
+########################################################################
+class stageScheduler():
+	'''
+	Start stages once the stages they depend on have finished, without
+	using more than jobs cpu cores at once.
+
+	Each stage is told how many cores it was given by calling its target
+	with the keyword argument jobs, so it can size the worker pools and
+	thread counts of the tools it runs.
+	'''
+	def __init__(self, jobs, debug=None):
+		self.jobs = max(1, jobs)
+		self.debug = debug
+		self.stages = list()
+	def add(self, name, target, args=(), depends=(), priority=0, cores=1):
+		'''
+		Add a stage to be run, see stage() for the arguments.
+		'''
+		self.stages.append(stage(name, target, args, depends, priority, cores))
+	def log(self, *arguments):
+		'''
+		Write a line to the debug output if there is one.
+		'''
+		if self.debug != None:
+			self.debug.add(*arguments)
+	def names(self):
+		'''
+		Return the names of all of the stages.
+		'''
+		return [item.name for item in self.stages]
+	def ready(self, pending, finished):
+		'''
+		Return the pending stages that have all of their dependencies
+		finished, highest priority first.
+		'''
+		readyStages = list()
+		for item in pending:
+			# dependencies on stages that were never added are ignored
+			missing = [name for name in item.depends \
+				if name in self.names() and name not in finished]
+			if len(missing) == 0:
+				readyStages.append(item)
+		readyStages.sort(key=lambda item: -item.priority)
+		return readyStages
+	def start(self, item, freeCores):
+		'''
+		Start a stage with as many of the free cores as it can use.
+		'''
+		item.grantedCores = max(1, min(item.cores, freeCores))
+		self.log('Starting stage '+item.name+' with cores',item.grantedCores)
+		item.process = Process(name=item.name, target=item.target, \
+			args=item.args, kwargs={'jobs': item.grantedCores})
+		item.process.start()
+	def wait(self, running):
+		'''
+		Block until at least one of the running stages has finished and
+		return the finished stages.
+		'''
+		if waitForProcesses != None:
+			waitForProcesses([item.process.sentinel for item in running])
+		else:
+			# join with a timeout sleeps instead of spinning
+			while not [item for item in running if not item.process.is_alive()]:
+				running[0].process.join(0.5)
+		finishedStages = list()
+		for item in running:
+			if not item.process.is_alive():
+				item.process.join()
+				item.exitCode = item.process.exitcode
+				self.log('Finished stage '+item.name+' with exit code',item.exitCode)
+				finishedStages.append(item)
+		return finishedStages
+	def run(self):
+		'''
+		Run all of the stages and wait for them to finish. Return a dict
+		of the exit code of each stage.
+		'''
+		pending = list(self.stages)
+		running = list()
+		finished = set()
+		while len(pending) > 0 or len(running) > 0:
+			usedCores = sum(item.grantedCores for item in running)
+			for item in self.ready(pending, finished):
+				if usedCores >= self.jobs:
+					break
+				self.start(item, self.jobs - usedCores)
+				usedCores += item.grantedCores
+				pending.remove(item)
+				running.append(item)
+			if len(running) == 0:
+				# nothing can start, this only happens with a dependency loop
+				self.log('Stages can not be started',[item.name for item in pending])
+				break
+			for item in self.wait(running):
+				running.remove(item)
+				finished.add(item.name)
+		return dict((item.name, item.exitCode) for item in self.stages)
@@ -0,0 +1,109 @@
+########################################################################
+# Run python scripts from the project in worker processes
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+import sys
+import runpy
+from os.path import dirname
+from os.path import exists as pathExists
+from multiprocessing import Process
+from timeit import default_timer
+from workspace import enterWorkspace
+try:
+	# block on the process sentinels when available
+	from multiprocessing.connection import wait as waitForProcesses
+except ImportError:
+	waitForProcesses = None
+########################################################################
+def prepareScript(filePath, name):
+	'''
+	Set up the worker process to run the python script at filePath the
+	way "python script.py" would. Temporary files made by the script go
+	in a scratch directory starting with name and its output is thrown
+	away since it is not part of the report.
+	'''
+	sys.argv = [filePath]
+	sys.path.insert(0, dirname(filePath))
+	sys.dont_write_bytecode = True
+	enterWorkspace(name)
+	nullFile = os.open(os.devnull, os.O_WRONLY)
+	os.dup2(nullFile, 1)
+	os.close(nullFile)
+########################################################################
+def runMain(filePath):
+	'''
+	Run the python script at filePath as __main__. A script that fails
+	or exits is stopped there, what was recorded of it is still useful.
+	'''
+	try:
+		runpy.run_path(filePath, run_name='__main__')
+	except (Exception, SystemExit, KeyboardInterrupt):
+		pass
+########################################################################
+def runWorkers(workers, jobs=1, timeout=None):
+	'''
+	Run workers, a list of tuples of a target, its arguments and the
+	output path it writes, in worker processes so the scripts they run
+	can not change the state of the report. Up to jobs workers run at
+	once and each is killed if it runs longer than timeout seconds.
+	Return a list of True for each worker that wrote its output path.
+
+	The workers are started and waited for from the calling thread, so
+	they are never forked from a process with other threads running.
+	'''
+	for target, arguments, outputPath in workers:
+		if pathExists(outputPath):
+			os.remove(outputPath)
+	pending = list(enumerate(workers))
+	# each running worker with its index and the time it must finish by
+	running = list()
+	while len(pending) > 0 or len(running) > 0:
+		while len(pending) > 0 and len(running) < max(1, jobs):
+			index, (target, arguments, outputPath) = pending.pop(0)
+			worker = Process(target=target, args=arguments)
+			worker.start()
+			deadline = None
+			if timeout != None:
+				deadline = default_timer() + timeout
+			running.append((worker, index, deadline))
+		# wait for a worker to finish or the next deadline to pass
+		deadlines = [item[2] for item in running if item[2] != None]
+		waitTime = None
+		if len(deadlines) > 0:
+			waitTime = max(0, min(deadlines) - default_timer())
+		if waitForProcesses != None:
+			waitForProcesses([item[0].sentinel for item in running], waitTime)
+		else:
+			# join with a timeout sleeps instead of spinning
+			running[0][0].join(0.5 if waitTime == None else min(0.5, waitTime))
+		for item in list(running):
+			worker, index, deadline = item
+			if worker.is_alive():
+				if deadline == None or default_timer() < deadline:
+					continue
+				# the script is taking too long
+				worker.terminate()
+			worker.join()
+			running.remove(item)
+	return [pathExists(outputPath) for target, arguments, outputPath in workers]
+########################################################################
+def runWorker(target, arguments, outputPath, timeout=None):
+	'''
+	Call target with arguments in a worker process, see runWorkers().
+	Return True if the worker wrote outputPath.
+	'''
+	return runWorkers([(target, arguments, outputPath)], 1, timeout)[0]
@@ -0,0 +1,133 @@
+########################################################################
+# Build the source code download of the report from git
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+from os.path import dirname
+from os.path import exists as pathExists
+from commandrunner import findProgram
+from commandrunner import runPipeline
+from diskcache import diskCache
+from diskcache import hashKey
+from githistory import headCommit
+from workspace import linkFile
+from workspace import moveFile
+from workspace import removeWorkspace
+from workspace import scratchPath
+from workspace import workspacePrefix
+########################################################################
+# the file extension used for each archive format
+archiveExtensions = {
+	'gzip': '.tar.gz',
+	'pigz': '.tar.gz',
+	'zstd': '.tar.zst',
+	'xz': '.tar.xz',
+	'7z': '.tar.7z',
+	'zip': '.zip'
+}
+# the compression level used when none is given, these favor speed
+defaultLevels = {
+	'gzip': 6,
+	'pigz': 6,
+	'zstd': 3,
+	'xz': 3,
+	'7z': 5,
+	'zip': 6
+}
+########################################################################
+def chooseFormat(archiveFormat, jobs):
+	'''
+	Return the format that will really be used for archiveFormat. gzip
+	is done by pigz when it is installed and more than one core can be
+	used, the output is the same kind of file.
+	'''
+	if archiveFormat == 'gzip' and jobs > 1 and findProgram('pigz'):
+		return 'pigz'
+	return archiveFormat
+########################################################################
+def archiveCommands(directory, archiveFormat, level, jobs, prefix, outputPath):
+	'''
+	Return the pipeline of commands that writes the archive of HEAD in
+	directory and True if the output of the pipeline is the archive, or
+	False if the last command writes outputPath itself.
+	'''
+	level = str(level)
+	jobs = str(jobs)
+	if archiveFormat == 'zip':
+		# git compresses zip archives itself
+		return ([['git', 'archive', '--format=zip', '-'+level, \
+			'--prefix='+prefix, 'HEAD']], True)
+	tarCommand = ['git', 'archive', '--format=tar', '--prefix='+prefix, 'HEAD']
+	if headCommit(directory) == False:
+		# the project is not a git repository, archive the directory
+		tarCommand = ['tar', '-c', '--exclude=./.git', '--exclude=./report', \
+			'--exclude=./'+workspacePrefix+'*', \
+			'--transform=s,^\\./,'+prefix+',', '-f', '-', '.']
+	if archiveFormat == 'gzip':
+		return ([tarCommand, ['gzip', '-c', '-'+level]], True)
+	elif archiveFormat == 'pigz':
+		return ([tarCommand, ['pigz', '-c', '-p', jobs, '-'+level]], True)
+	elif archiveFormat == 'zstd':
+		return ([tarCommand, ['zstd', '-c', '-q', '-T'+jobs, '-'+level]], True)
+	elif archiveFormat == 'xz':
+		return ([tarCommand, ['xz', '-c', '-T', jobs, '-'+level]], True)
+	elif archiveFormat == '7z':
+		# 7z can not write its own format to stdout
+		return ([tarCommand, ['7z', 'a', '-bd', '-y', '-si', '-mx='+level, \
+			'-mmt='+jobs, outputPath]], False)
+	raise ValueError('Unknown archive format '+archiveFormat)
+########################################################################
+def buildArchive(directory, outputPath, archiveFormat='gzip', level=None, jobs=1, \
+		prefix='source/', cacheDirectory=None, cacheBytes=500*1024*1024, debug=None):
+	'''
+	Write an archive of the files committed at HEAD in directory to
+	outputPath. The archive is streamed from "git archive" through the
+	compressor for archiveFormat so the working tree, the .git
+	directory and old reports are never read.
+
+	The archive is built in a scratch file and moved to outputPath when
+	it is finished. It is cached by HEAD, the format and the level so it
+	is only built again when there is a new commit. Return True if the
+	archive was written.
+	'''
+	archiveFormat = chooseFormat(archiveFormat, jobs)
+	if level == None:
+		level = defaultLevels[archiveFormat]
+	head = headCommit(directory)
+	archiveCache = diskCache('archive', cacheDirectory, cacheBytes)
+	cacheKey = False
+	if head != False:
+		# pigz writes the same kind of file as gzip
+		cacheKey = hashKey('archive', head, archiveExtensions[archiveFormat], \
+			str(level), prefix)
+		if archiveCache.has(cacheKey):
+			linkFile(archiveCache.path(cacheKey), outputPath)
+			return True
+	buildPath = scratchPath(outputPath)
+	commands, streamed = archiveCommands(directory, archiveFormat, level, jobs, \
+		prefix, buildPath)
+	if streamed:
+		result = runPipeline(commands, outputFile=buildPath, cwd=directory, debug=debug)
+	else:
+		result = runPipeline(commands, cwd=directory, debug=debug)
+	if not result.succeeded() or not pathExists(buildPath):
+		# never leave a broken archive behind
+		removeWorkspace(dirname(buildPath))
+		return False
+	if cacheKey != False:
+		archiveCache.putFile(cacheKey, buildPath)
+		archiveCache.prune()
+	moveFile(buildPath, outputPath)
+	return True
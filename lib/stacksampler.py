@@ -0,0 +1,275 @@
+########################################################################
+# Sample the stacks of a running python script and draw a flamegraph
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import sys
+import threading
+from os.path import basename
+from files import escapeHTML
+from scriptrunner import prepareScript
+from scriptrunner import runMain
+from scriptrunner import runWorker
+from workspace import moveFile
+from workspace import scratchPath
+########################################################################
+# the size of the flamegraph
+graphWidth = 1200
+frameHeight = 16
+# zoom into a frame by clicking on it, click the bottom frame to reset
+zoomScript = '''<script type="text/ecmascript"><![CDATA[
+function zoom(frame){
+	var x = parseFloat(frame.getAttribute('data-x'));
+	var width = parseFloat(frame.getAttribute('data-width'));
+	var depth = parseInt(frame.getAttribute('data-depth'));
+	var frames = document.getElementsByTagName('g');
+	for (var index = 0; index < frames.length; index++){
+		var item = frames[index];
+		if (!item.hasAttribute('data-x')){
+			continue;
+		}
+		var itemX = parseFloat(item.getAttribute('data-x'));
+		var itemWidth = parseFloat(item.getAttribute('data-width'));
+		var itemDepth = parseInt(item.getAttribute('data-depth'));
+		// the frames below the clicked frame are the ones that contain it,
+		// they are widened, the frames above it are the ones inside of it
+		var ancestor = itemDepth < depth;
+		var shown;
+		if (ancestor){
+			shown = itemX <= x + 1e-9 && itemX + itemWidth >= x + width - 1e-9;
+		} else {
+			shown = itemX >= x - 1e-9 && itemX + itemWidth <= x + width + 1e-9;
+		}
+		if (!shown){
+			item.style.display = 'none';
+			continue;
+		}
+		item.style.display = 'block';
+		var newX = ancestor ? 0 : (itemX - x) / width;
+		var newWidth = ancestor ? 1 : itemWidth / width;
+		var rect = item.getElementsByTagName('rect')[0];
+		var text = item.getElementsByTagName('text')[0];
+		rect.setAttribute('x', newX * WIDTH);
+		rect.setAttribute('width', newWidth * WIDTH);
+		text.setAttribute('x', newX * WIDTH + 3);
+		var label = item.getAttribute('data-name');
+		var characters = Math.floor(newWidth * WIDTH / 7);
+		text.textContent = characters < 3 ? '' : (label.length > characters ? label.substring(0, characters - 2) + '..' : label);
+	}
+}
+]]></script>
+'''
+########################################################################
+def frameName(frame):
+	'''
+	Return the name of the function running in a stack frame.
+	'''
+	code = frame.f_code
+	return code.co_name+' ('+basename(code.co_filename)+':'+str(code.co_firstlineno)+')'
+########################################################################
+class stackSampler():
+	'''
+	Sample the stacks of every thread of this process rate times a
+	second from a background thread. The samples are counted as folded
+	stacks, the function names of a stack from the outermost frame to
+	the innermost joined with semicolons. Stacks start at the module
+	code of rootFile if it is given, the frames that ran it are left
+	out.
+	'''
+	def __init__(self, rate=100, rootFile=None):
+		self.interval = 1.0 / max(1, rate)
+		self.rootFile = rootFile
+		self.counts = dict()
+		self.stopEvent = threading.Event()
+		self.thread = threading.Thread(target=self.sample)
+		self.thread.daemon = True
+	def start(self):
+		# let the sampler thread take the interpreter lock soon after it
+		# wakes up so the samples are on time
+		if hasattr(sys, 'setswitchinterval'):
+			sys.setswitchinterval(min(sys.getswitchinterval(), self.interval / 4))
+		self.thread.start()
+	def stop(self):
+		self.stopEvent.set()
+		self.thread.join()
+	def sample(self):
+		'''
+		Take samples until the sampler is stopped.
+		'''
+		samplerId = threading.current_thread().ident
+		while not self.stopEvent.wait(self.interval):
+			for threadId, frame in sys._current_frames().items():
+				if threadId == samplerId:
+					continue
+				names = list()
+				while frame is not None:
+					names.append(frameName(frame))
+					code = frame.f_code
+					if code.co_name == '<module>' and code.co_filename == self.rootFile:
+						break
+					frame = frame.f_back
+				stack = ';'.join(reversed(names))
+				self.counts[stack] = self.counts.get(stack, 0) + 1
+########################################################################
+def runSampler(filePath, foldedPath, rate):
+	'''
+	Run the python script at filePath as __main__ while sampling its
+	stacks and save the folded stacks to foldedPath. This runs inside of
+	the worker process.
+	'''
+	prepareScript(filePath, 'sampler')
+	sampler = stackSampler(rate, filePath)
+	sampler.start()
+	runMain(filePath)
+	sampler.stop()
+	samplesPath = scratchPath(foldedPath)
+	fileObject = open(samplesPath, 'w')
+	for stack, count in sorted(sampler.counts.items()):
+		fileObject.write(stack+' '+str(count)+'\n')
+	fileObject.close()
+	moveFile(samplesPath, foldedPath)
+########################################################################
+def sampleWorker(filePath, foldedPath, rate=100):
+	'''
+	Return the worker that samples the python script at filePath and
+	saves the folded stacks to foldedPath, for runWorkers().
+	'''
+	return (runSampler, (filePath, foldedPath, rate), foldedPath)
+########################################################################
+def sampleScript(filePath, foldedPath, rate=100, timeout=None):
+	'''
+	Sample the python script at filePath in a worker process and save
+	the folded stacks to foldedPath. Return True if they were written.
+	'''
+	return runWorker(*sampleWorker(filePath, foldedPath, rate), timeout=timeout)
+########################################################################
+def loadFolded(foldedPath):
+	'''
+	Load the folded stacks saved in foldedPath as a dict of the count of
+	each stack.
+	'''
+	counts = dict()
+	fileObject = open(foldedPath, 'r')
+	for line in fileObject:
+		stack, separator, count = line.rstrip('\n').rpartition(' ')
+		if separator != '' and count.isdigit():
+			counts[stack] = counts.get(stack, 0) + int(count)
+	fileObject.close()
+	return counts
+########################################################################
+def buildTree(counts):
+	'''
+	Merge the folded stacks into a tree of frames. Every node is a list
+	of the name, the samples in the frame and below it and a dict of the
+	child nodes.
+	'''
+	root = ['all', 0, dict()]
+	for stack, count in counts.items():
+		node = root
+		node[1] += count
+		for name in stack.split(';'):
+			if name not in node[2]:
+				node[2][name] = [name, 0, dict()]
+			node = node[2][name]
+			node[1] += count
+	return root
+########################################################################
+def treeDepth(node):
+	'''
+	Return the depth of the deepest frame below node.
+	'''
+	depth = 0
+	stack = [(node, 0)]
+	while stack:
+		node, level = stack.pop()
+		depth = max(depth, level)
+		for child in node[2].values():
+			stack.append((child, level + 1))
+	return depth
+########################################################################
+def renderFlamegraph(counts, title='Flamegraph'):
+	'''
+	Render the folded stacks as a svg flamegraph. The width of each frame
+	is its share of the samples, callers are below the functions they
+	call and clicking a frame zooms into it.
+	'''
+	root = buildTree(counts)
+	total = max(root[1], 1)
+	height = (treeDepth(root) + 1) * frameHeight + 40
+	svg = "<?xml version='1.0' standalone='no'?>\n"
+	svg += "<svg version='1.1' width='"+str(graphWidth)+"' height='"+str(height)+"'"
+	svg += " xmlns='http://www.w3.org/2000/svg'>\n"
+	svg += zoomScript.replace('WIDTH', str(graphWidth))
+	svg += "<text x='"+str(graphWidth // 2)+"' y='20' text-anchor='middle'"
+	svg += " font-family='sans-serif' font-size='16'>"+escapeHTML(title)+"</text>\n"
+	# draw the frames from the bottom up, children are placed from the
+	# left in name order
+	nodes = [(root, 0.0, 0)]
+	while nodes:
+		node, x, depth = nodes.pop()
+		width = node[1] / float(total)
+		y = height - (depth + 1) * frameHeight
+		name = node[0]
+		percent = 100.0 * node[1] / total
+		# the color of a frame only depends on its name
+		hue = sum(ord(character) for character in name) % 60
+		characters = int(width * graphWidth / 7)
+		label = name if len(name) <= characters else name[:max(0, characters - 2)]+'..'
+		if characters < 3:
+			label = ''
+		svg += "<g onclick='zoom(this)' data-x='"+repr(x)+"' data-width='"+repr(width)+"'"
+		svg += " data-depth='"+str(depth)+"' data-name='"+escapeHTML(name)+"'>\n"
+		svg += "<title>"+escapeHTML(name)+" ("+str(node[1])+" samples, "+('%.2f' % percent)+"%)</title>\n"
+		svg += "<rect x='"+('%.2f' % (x * graphWidth))+"' y='"+str(y)+"' width='"
+		svg += ('%.2f' % (width * graphWidth))+"' height='"+str(frameHeight - 1)+"'"
+		svg += " fill='rgb(230,"+str(80 + hue * 2)+",50)' />\n"
+		svg += "<text x='"+('%.2f' % (x * graphWidth + 3))+"' y='"+str(y + frameHeight - 4)+"'"
+		svg += " font-family='monospace' font-size='11'>"+escapeHTML(label)+"</text>\n"
+		svg += "</g>\n"
+		childX = x
+		for childName in sorted(node[2]):
+			child = node[2][childName]
+			nodes.append((child, childX, depth + 1))
+			childX += child[1] / float(total)
+	svg += "</svg>\n"
+	return svg
+########################################################################
+def renderSampleTable(counts, limit=50):
+	'''
+	Render a html table of the functions seen in the most samples, with
+	the samples spent in the function itself and in everything it
+	called.
+	'''
+	total = max(sum(counts.values()), 1)
+	ownSamples = dict()
+	allSamples = dict()
+	for stack, count in counts.items():
+		names = stack.split(';')
+		ownSamples[names[-1]] = ownSamples.get(names[-1], 0) + count
+		# recursive functions are only counted once for each stack
+		for name in set(names):
+			allSamples[name] = allSamples.get(name, 0) + count
+	table = '<table>\n'
+	table += '\t<tr><th>Function</th><th>Own samples</th><th>Own %</th>'
+	table += '<th>Total samples</th><th>Total %</th></tr>\n'
+	order = sorted(allSamples, key=lambda name: (-ownSamples.get(name, 0), -allSamples[name]))
+	for name in order[:limit]:
+		table += '\t<tr><td>'+escapeHTML(name)+'</td>'
+		table += '<td>'+str(ownSamples.get(name, 0))+'</td>'
+		table += '<td>'+('%.2f' % (100.0 * ownSamples.get(name, 0) / total))+'</td>'
+		table += '<td>'+str(allSamples[name])+'</td>'
+		table += '<td>'+('%.2f' % (100.0 * allSamples[name] / total))+'</td></tr>\n'
+	table += '</table>\n'
+	return table
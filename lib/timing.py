@@ -0,0 +1,163 @@
+########################################################################
+# Record the time, cpu and memory used by stages and commands
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+import json
+import resource
+from time import time
+from timeit import default_timer
+from os.path import exists as pathExists
+from files import escapeHTML
+from files import saveFile
+########################################################################
+# records are appended to this file as json lines by every process,
+# timing is disabled while it is None
+timingFile = None
+# the name of the stage running in this process
+currentStage = 'main'
+########################################################################
+def usage():
+	'''
+	Return the cpu seconds used by this process and by its finished child
+	processes along with the peak resident memory of each in kilobytes.
+	'''
+	selfUsage = resource.getrusage(resource.RUSAGE_SELF)
+	childUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+	return {
+		'cpu': selfUsage.ru_utime + selfUsage.ru_stime,
+		'childCpu': childUsage.ru_utime + childUsage.ru_stime,
+		'rss': selfUsage.ru_maxrss,
+		'childRss': childUsage.ru_maxrss
+	}
+########################################################################
+def startTimer():
+	'''
+	Return the starting point for a measurement, pass it to one of the
+	record functions when the work is done.
+	'''
+	return (default_timer(), usage())
+########################################################################
+def writeRecord(record):
+	'''
+	Append a record to the timing file. Every record is written with a
+	single write to a file opened for appending so records from
+	different processes do not mix.
+	'''
+	if timingFile == None:
+		return
+	line = (json.dumps(record)+'\n').encode('utf-8')
+	fileDescriptor = os.open(timingFile, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+	os.write(fileDescriptor, line)
+	os.close(fileDescriptor)
+########################################################################
+def recordCommandUsage(command, wallTime, cpuTime, peakRss, outputBytes):
+	'''
+	Record a finished command with the resources it used, these come
+	from os.wait4() so they belong to the command alone.
+	'''
+	if timingFile == None:
+		return
+	writeRecord({
+		'type': 'command',
+		'stage': currentStage,
+		'command': command,
+		'wallTime': wallTime,
+		'cpuTime': cpuTime,
+		'peakRss': peakRss,
+		'outputBytes': outputBytes
+	})
+########################################################################
+def recordStage(name, start):
+	'''
+	Record a finished stage. The cpu time includes the stage process and
+	all of the commands and workers it ran.
+	'''
+	if timingFile == None:
+		return
+	startTime, startUsage = start
+	endUsage = usage()
+	writeRecord({
+		'type': 'stage',
+		'stage': name,
+		'wallTime': default_timer() - startTime,
+		'cpuTime': (endUsage['cpu'] - startUsage['cpu']) + \
+			(endUsage['childCpu'] - startUsage['childCpu']),
+		'peakRss': max(endUsage['rss'], endUsage['childRss'])
+	})
+########################################################################
+def collectTimings(outputPath):
+	'''
+	Gather the records written to the timing file into a single json
+	file at outputPath and remove the timing file. Return the records.
+	'''
+	records = list()
+	if timingFile != None and pathExists(timingFile):
+		fileObject = open(timingFile, 'r')
+		for line in fileObject:
+			try:
+				records.append(json.loads(line))
+			except ValueError:
+				continue
+		fileObject.close()
+		os.remove(timingFile)
+	saveFile(outputPath, json.dumps({'created': time(), 'records': records}, indent=1))
+	return records
+########################################################################
+def renderTimings(records):
+	'''
+	Render the timing records as a html page with a table of stages and
+	a table of the commands run by each stage, slowest first.
+	'''
+	page = "<html><style>\n"
+	page += "td{border-width:3px;border-style:solid;}\n"
+	page += "th{border-width:3px;border-style:solid;\n"
+	page += "color:white;background-color:black;}\n"
+	page += "</style><body>\n"
+	page += "<a href='index.html'><h1>Main Project Report</h1></a><hr />\n"
+	page += "<h2>Stages</h2>\n"
+	page += "<table>\n"
+	page += "<tr><th>Stage</th><th>Wall seconds</th><th>CPU seconds</th><th>Peak RSS KB</th></tr>\n"
+	stages = [record for record in records if record['type'] == 'stage']
+	stages.sort(key=lambda record: -record['wallTime'])
+	for record in stages:
+		page += '<tr><td>'+escapeHTML(record['stage'])+'</td>'
+		page += '<td>'+('%.2f' % record['wallTime'])+'</td>'
+		page += '<td>'+('%.2f' % record['cpuTime'])+'</td>'
+		page += '<td>'+str(record['peakRss'])+'</td></tr>\n'
+	page += "</table>\n"
+	page += "<h2>Commands</h2>\n"
+	page += "<table>\n"
+	page += "<tr><th>Stage</th><th>Command</th><th>Wall seconds</th><th>CPU seconds</th>"
+	page += "<th>Peak RSS KB</th><th>Output bytes</th></tr>\n"
+	commands = [record for record in records if record['type'] == 'command']
+	commands.sort(key=lambda record: -record['wallTime'])
+	for record in commands:
+		command = record['command']
+		if len(command) > 0 and isinstance(command[0], list):
+			# a pipeline of commands
+			command = ' | '.join(' '.join(part) for part in command)
+		elif not isinstance(command, str):
+			command = ' '.join(command)
+		page += '<tr><td>'+escapeHTML(record['stage'])+'</td>'
+		page += '<td><code>'+escapeHTML(command)+'</code></td>'
+		page += '<td>'+('%.2f' % record['wallTime'])+'</td>'
+		page += '<td>'+('%.2f' % record['cpuTime'])+'</td>'
+		page += '<td>'+str(record['peakRss'])+'</td>'
+		page += '<td>'+str(record['outputBytes'])+'</td></tr>\n'
+	page += "</table>\n"
+	page += "</body></html>\n"
+	return page
@@ -0,0 +1,176 @@
+########################################################################
+# Draw uml diagrams of the python packages in a project
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+import json
+from shutil import rmtree
+from tempfile import mkdtemp
+from os.path import dirname
+from os.path import relpath
+from os.path import exists as pathExists
+from os.path import join as pathJoin
+from multiprocessing import Pool
+from commandrunner import findProgram
+from commandrunner import runCommand
+from diskcache import diskCache
+from diskcache import hashFile
+from diskcache import hashKey
+from workspace import enterWorkspace
+from workspace import linkFile
+from workspace import moveFile
+from workspace import scratchPath
+########################################################################
+# the formats every diagram is drawn in
+diagramFormats = ('png', 'svg')
+########################################################################
+def packageName(directory, projectDirectory):
+	'''
+	Return the name of the package in directory, the path of the
+	directory in the project with dots between the parts.
+	'''
+	name = relpath(directory, projectDirectory).replace(os.sep, '.')
+	if name in ('.', ''):
+		# the files at the top of the project
+		name = 'project'
+	return name
+########################################################################
+def findPackages(filePaths, projectDirectory):
+	'''
+	Group the python files by the directory they are in. Return a dict
+	mapping each package name to its list of files.
+	'''
+	packages = dict()
+	for filePath in filePaths:
+		name = packageName(dirname(filePath), projectDirectory)
+		packages.setdefault(name, list()).append(filePath)
+	return packages
+########################################################################
+def findPyreverse():
+	'''
+	Return the installed pyreverse commands, the python 3 version is
+	tried when the default one can not read the code.
+	'''
+	return [name for name in ('pyreverse', 'pyreverse3') if findProgram(name)]
+########################################################################
+def reversePackage(name, filePaths, pyreverseCommands, cacheDirectory=None, \
+		cacheBytes=500*1024*1024, debug=None):
+	'''
+	Run pyreverse once over all of the files of a package in a private
+	directory. Return a dict mapping the kind of each diagram, classes
+	or packages, to its dot source.
+
+	The dot sources are cached by the content of the files so pyreverse
+	only runs again when the package changes, a failed run is not cached
+	so it is tried again with the next report.
+	'''
+	dotCache = diskCache('pyreverse', cacheDirectory, cacheBytes)
+	cacheKey = hashKey('pyreverse', name, ' '.join(pyreverseCommands), \
+		*[filePath+':'+str(hashFile(filePath)) for filePath in sorted(filePaths)])
+	cached = dotCache.get(cacheKey)
+	if cached != False:
+		return json.loads(cached.decode('utf-8'))
+	sources = dict()
+	succeeded = False
+	workDirectory = mkdtemp(prefix='pyreverse-')
+	try:
+		for command in pyreverseCommands:
+			result = runCommand([command, '-o', 'dot', '-p', name] + list(filePaths), \
+				cwd=workDirectory, hideErrors=True, debug=debug)
+			for fileName in sorted(os.listdir(workDirectory)):
+				# the files are named classes_name.dot or classes.name.dot
+				kind = fileName.split('.')[0].split('_')[0]
+				if fileName.endswith('.dot') and kind in ('classes', 'packages'):
+					fileObject = open(pathJoin(workDirectory, fileName), 'r')
+					sources[kind] = fileObject.read()
+					fileObject.close()
+			if len(sources) > 0:
+				succeeded = result.succeeded()
+				break
+	finally:
+		rmtree(workDirectory)
+	if succeeded:
+		dotCache.put(cacheKey, json.dumps(sources))
+	return sources
+########################################################################
+def renderWorker(arguments):
+	'''
+	Draw a single dot source, used by the worker pool. Return the output
+	path and True if the diagram was drawn.
+
+	arguments is a tuple of the dot source, the format, the output path
+	and the cache settings.
+	'''
+	dotSource, diagramFormat, outputPath, cacheDirectory, cacheBytes = arguments
+	diagramCache = diskCache('diagrams', cacheDirectory, cacheBytes)
+	cacheKey = hashKey('dot', diagramFormat, dotSource)
+	if diagramCache.has(cacheKey):
+		linkFile(diagramCache.path(cacheKey), outputPath)
+		return (outputPath, True)
+	dotPath = scratchPath(outputPath+'.dot')
+	fileObject = open(dotPath, 'w')
+	fileObject.write(dotSource)
+	fileObject.close()
+	drawPath = dotPath[:-len('.dot')]
+	result = runCommand(['dot', '-T'+diagramFormat, dotPath], outputFile=drawPath)
+	os.remove(dotPath)
+	if not result.succeeded() or not pathExists(drawPath):
+		return (outputPath, False)
+	diagramCache.putFile(cacheKey, drawPath)
+	moveFile(drawPath, outputPath)
+	return (outputPath, True)
+########################################################################
+def drawDiagrams(filePaths, projectDirectory, outputDirectory, jobs=1, \
+		cacheDirectory=None, cacheBytes=500*1024*1024, debug=None):
+	'''
+	Draw the class and package diagrams of every package in the project.
+	pyreverse runs once for each package and the diagrams are drawn by a
+	pool of jobs worker processes, diagrams that were drawn before are
+	copied from the cache.
+
+	Return a dict mapping each file to the names of the diagrams of its
+	package, without the format extension, relative to outputDirectory.
+	'''
+	pyreverseCommands = findPyreverse()
+	diagrams = dict()
+	if len(pyreverseCommands) == 0 or not findProgram('dot'):
+		return diagrams
+	if not pathExists(outputDirectory):
+		os.makedirs(outputDirectory)
+	work = list()
+	for name, packageFiles in sorted(findPackages(filePaths, projectDirectory).items()):
+		names = list()
+		sources = reversePackage(name, packageFiles, pyreverseCommands, \
+			cacheDirectory, cacheBytes, debug)
+		for kind in sorted(sources):
+			diagramName = name+'.'+kind
+			names.append(diagramName)
+			for diagramFormat in diagramFormats:
+				work.append((sources[kind], diagramFormat, \
+					pathJoin(outputDirectory, diagramName+'.'+diagramFormat), \
+					cacheDirectory, cacheBytes))
+		for filePath in packageFiles:
+			diagrams[filePath] = names
+	if len(work) > 0:
+		pool = Pool(max(1, min(jobs, len(work))), enterWorkspace, ('uml',))
+		for outputPath, drawn in pool.imap_unordered(renderWorker, work):
+			if not drawn and debug != None:
+				debug.warning('Failed to draw diagram',outputPath)
+		pool.close()
+		pool.join()
+	diskCache('diagrams', cacheDirectory, cacheBytes).prune()
+	diskCache('pyreverse', cacheDirectory, cacheBytes).prune()
+	return diagrams
@@ -0,0 +1,203 @@
+########################################################################
+# Watch a repository for new commits and serve the report over http
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from os.path import abspath
+from os.path import relpath
+from os.path import join as pathJoin
+try:
+	from http.server import HTTPServer
+	from http.server import SimpleHTTPRequestHandler
+	from socketserver import ThreadingMixIn
+except ImportError:
+	# python 2
+	from BaseHTTPServer import HTTPServer
+	from SimpleHTTPServer import SimpleHTTPRequestHandler
+	from SocketServer import ThreadingMixIn
+########################################################################
+# the inotify events that show a ref was written, created or removed
+inotifyMask = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+# git writes several files for a single change, events are gathered
+# until none have arrived for this many seconds
+settleTime = 0.5
+# the header of each inotify event, the watch, mask, cookie and the
+# length of the name that follows it
+eventHeader = struct.Struct('iIII')
+# the files in the git directory that are refs, the rest such as the
+# index change without a new commit
+gitRefFiles = ('HEAD', 'packed-refs')
+########################################################################
+def loadInotify():
+	'''
+	Return the c library if it has the inotify functions or False if
+	they can not be used and the refs must be polled.
+	'''
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+		libc.inotify_init1
+		libc.inotify_add_watch
+	except (OSError, AttributeError):
+		return False
+	return libc
+########################################################################
+class repoWatcher():
+	'''
+	Wait for the refs of the git repository in gitDirectory to change.
+
+	HEAD, packed-refs and the refs directories are watched with inotify
+	when it is available, otherwise their modification times are read
+	every interval seconds.
+	'''
+	def __init__(self, gitDirectory, interval=2):
+		self.gitDirectory = gitDirectory
+		self.interval = interval
+		self.fileDescriptor = None
+		# the directory of each inotify watch
+		self.watches = dict()
+		libc = loadInotify()
+		if libc != False:
+			fileDescriptor = libc.inotify_init1(os.O_NONBLOCK)
+			if fileDescriptor >= 0:
+				self.libc = libc
+				self.fileDescriptor = fileDescriptor
+				self.addWatches()
+		self.state = self.refState()
+	def watchDirectories(self):
+		'''
+		Return the git directory and every directory below refs.
+		'''
+		directories = [self.gitDirectory]
+		for root, names, files in os.walk(pathJoin(self.gitDirectory, 'refs')):
+			directories.append(root)
+		return directories
+	def addWatches(self):
+		'''
+		Watch the directories refs can be written in, watching a directory
+		again does nothing so this also picks up new directories.
+		'''
+		for directory in self.watchDirectories():
+			watch = self.libc.inotify_add_watch(self.fileDescriptor, \
+				directory.encode('utf-8'), inotifyMask)
+			if watch >= 0:
+				self.watches[watch] = directory
+	def refState(self):
+		'''
+		Return the size and modification time of HEAD, packed-refs and
+		every ref file.
+		'''
+		paths = [pathJoin(self.gitDirectory, 'HEAD'), pathJoin(self.gitDirectory, 'packed-refs')]
+		for root, names, files in os.walk(pathJoin(self.gitDirectory, 'refs')):
+			paths += [pathJoin(root, name) for name in files]
+		state = list()
+		for path in sorted(paths):
+			try:
+				info = os.stat(path)
+			except OSError:
+				continue
+			state.append((path, info.st_size, info.st_mtime))
+		return state
+	def readEvents(self, timeout):
+		'''
+		Wait up to timeout seconds for inotify events and read all of them.
+		Return True if any of them were for a ref.
+		'''
+		ready = select.select([self.fileDescriptor], [], [], timeout)[0]
+		if len(ready) == 0:
+			return False
+		changed = False
+		try:
+			while True:
+				events = os.read(self.fileDescriptor, 65536)
+				if not events:
+					break
+				position = 0
+				while position < len(events):
+					watch, mask, cookie, length = eventHeader.unpack_from(events, position)
+					position += eventHeader.size
+					name = events[position:position + length].rstrip(b'\0').decode('utf-8', 'replace')
+					position += length
+					if self.watches.get(watch) != self.gitDirectory or name in gitRefFiles:
+						changed = True
+		except OSError as error:
+			if error.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+				raise
+		return changed
+	def wait(self):
+		'''
+		Block until the refs change.
+		'''
+		if self.fileDescriptor != None:
+			while not self.readEvents(None):
+				pass
+			while self.readEvents(settleTime):
+				pass
+			# new branches can add directories below refs
+			self.addWatches()
+			return
+		while True:
+			time.sleep(self.interval)
+			state = self.refState()
+			if state != self.state:
+				self.state = state
+				return
+	def close(self):
+		if self.fileDescriptor != None:
+			os.close(self.fileDescriptor)
+			self.fileDescriptor = None
+########################################################################
+class reportHandler(SimpleHTTPRequestHandler):
+	'''
+	Serve the files of the report. The report path is read again for
+	every request so a report that has been swapped in is served as
+	soon as it is published.
+	'''
+	reportPath = 'report'
+	debug = None
+	def translate_path(self, path):
+		path = SimpleHTTPRequestHandler.translate_path(self, path)
+		return pathJoin(self.reportPath, relpath(path, os.getcwd()))
+	def log_message(self, format, *arguments):
+		if self.debug != None:
+			self.debug.add('Served',format % arguments)
+########################################################################
+class reportServer(ThreadingMixIn, HTTPServer):
+	'''
+	A http server that answers each request in its own thread.
+	'''
+	daemon_threads = True
+########################################################################
+def serveReport(reportPath, port=8000, debug=None):
+	'''
+	Serve the report at reportPath on localhost from a background thread.
+	Return the server, call shutdown() on it to stop serving.
+	'''
+	class boundHandler(reportHandler):
+		pass
+	boundHandler.reportPath = abspath(reportPath)
+	boundHandler.debug = debug
+	server = reportServer(('127.0.0.1', port), boundHandler)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	return server
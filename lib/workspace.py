@@ -0,0 +1,288 @@
+########################################################################
+# Private scratch directories for the stages and workers of a report
+# Copyright (C) 2016  Carl J Smith
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+########################################################################
+import os
+import sys
+import errno
+import filecmp
+import tempfile
+from shutil import copyfile
+from shutil import rmtree
+from os.path import basename
+from os.path import dirname
+from os.path import getsize
+from os.path import isdir
+from os.path import isfile
+from os.path import islink
+from os.path import realpath
+from os.path import relpath
+from os.path import exists as pathExists
+from os.path import join as pathJoin
+########################################################################
+# every run of the report makes its own workspace in the project
+# directory, named with this prefix
+workspacePrefix = '.project-report-'
+# the directories made for single output files
+scratchPrefix = 'output-'
+# the report being built and the report it will replace, files moved
+# into the new report that are the same in the old one are linked to it
+stagingDirectory = None
+previousDirectory = None
+########################################################################
+def createWorkspace(directory):
+	'''
+	Create the workspace of this run inside of directory and make it the
+	place temporary files are made. Keeping it on the same filesystem as
+	the report lets finished files be renamed into the report.
+
+	Bytecode of the modules imported by the report, and by the python
+	tools it runs, is kept out of the project. Return the workspace path.
+	'''
+	workspace = tempfile.mkdtemp(prefix=workspacePrefix, dir=realpath(directory))
+	useDirectory(workspace)
+	sys.dont_write_bytecode = True
+	os.environ['PYTHONDONTWRITEBYTECODE'] = '1'
+	# python 3.8 and later write any bytecode below this directory
+	os.environ['PYTHONPYCACHEPREFIX'] = pathJoin(workspace, 'pycache')
+	return workspace
+########################################################################
+def useDirectory(directory):
+	'''
+	Make directory the place temporary files are made by this process
+	and the commands it runs.
+	'''
+	tempfile.tempdir = directory
+	os.environ['TMPDIR'] = directory
+########################################################################
+def enterWorkspace(name='worker'):
+	'''
+	Create a private scratch directory inside of the current one and use
+	it for the temporary files of this process. Stages call this when
+	they start and worker pools use it as their initializer so no two
+	workers share a directory. Return the scratch directory path.
+	'''
+	scratch = tempfile.mkdtemp(prefix=name+'-')
+	useDirectory(scratch)
+	return scratch
+########################################################################
+def removeWorkspace(workspace):
+	'''
+	Remove a workspace or scratch directory and everything in it.
+	'''
+	if pathExists(workspace):
+		rmtree(workspace, ignore_errors=True)
+	# go back to the default place for temporary files if it was removed
+	if tempfile.tempdir != None and not pathExists(tempfile.tempdir):
+		tempfile.tempdir = None
+		os.environ.pop('TMPDIR', None)
+########################################################################
+def scratchPath(outputPath):
+	'''
+	Return a path in a new scratch directory with the same name as
+	outputPath, the file is built there and then moved to outputPath
+	with moveFile().
+	'''
+	return pathJoin(tempfile.mkdtemp(prefix=scratchPrefix), basename(outputPath))
+########################################################################
+def moveFile(sourcePath, destinationPath):
+	'''
+	Move the finished file at sourcePath to destinationPath. Readers of
+	destinationPath see the old file or the new one, never part of it.
+	'''
+	if not linkPrevious(sourcePath, destinationPath):
+		renameFile(sourcePath, destinationPath)
+	# remove the directory made by scratchPath() for the file
+	if basename(dirname(sourcePath)).startswith(scratchPrefix):
+		try:
+			os.rmdir(dirname(sourcePath))
+		except OSError:
+			pass
+########################################################################
+def renameFile(sourcePath, destinationPath):
+	'''
+	Rename sourcePath to destinationPath, copying it when they are on
+	different filesystems.
+	'''
+	try:
+		os.rename(sourcePath, destinationPath)
+	except OSError as error:
+		if error.errno != errno.EXDEV:
+			raise
+		# the scratch directory is on another filesystem, copy the file
+		# next to the destination first so the rename is still atomic
+		tempPath = destinationPath+'.'+str(os.getpid())+'.tmp'
+		copyfile(sourcePath, tempPath)
+		os.rename(tempPath, destinationPath)
+		os.remove(sourcePath)
+########################################################################
+def previousFile(destinationPath):
+	'''
+	Return the path of the file in the previous report that is at the
+	same place as destinationPath in the report being built, or False
+	if destinationPath is not in the report or there is no such file.
+	'''
+	if stagingDirectory == None or previousDirectory == None:
+		return False
+	relative = relpath(pathJoin(realpath(dirname(destinationPath)), \
+		basename(destinationPath)), stagingDirectory)
+	if relative.startswith(os.pardir):
+		return False
+	previousPath = pathJoin(previousDirectory, relative)
+	if not isfile(previousPath):
+		return False
+	return previousPath
+########################################################################
+def replaceWithLink(sourcePath, destinationPath):
+	'''
+	Hardlink sourcePath in place of destinationPath in a single step.
+	Return False if the filesystem can not link them.
+	'''
+	tempPath = destinationPath+'.'+str(os.getpid())+'.tmp'
+	try:
+		os.link(sourcePath, tempPath)
+	except OSError:
+		return False
+	os.rename(tempPath, destinationPath)
+	return True
+########################################################################
+def linkPrevious(sourcePath, destinationPath):
+	'''
+	If destinationPath is in the report being built and the previous
+	report has the same file, link the previous file in its place and
+	remove sourcePath. Return True if the file was linked.
+	'''
+	previousPath = previousFile(destinationPath)
+	if previousPath == False or getsize(previousPath) != getsize(sourcePath):
+		return False
+	if not filecmp.cmp(sourcePath, previousPath, shallow=False):
+		return False
+	if not replaceWithLink(previousPath, destinationPath):
+		return False
+	os.remove(sourcePath)
+	return True
+########################################################################
+def linkTree(sourcePath, destinationPath):
+	'''
+	Fill destinationPath with links to the files below sourcePath, files
+	that can not be linked are copied.
+	'''
+	for root, directories, files in os.walk(sourcePath):
+		targetRoot = pathJoin(destinationPath, relpath(root, sourcePath))
+		if not isdir(targetRoot):
+			os.makedirs(targetRoot)
+		for name in files:
+			try:
+				os.link(pathJoin(root, name), pathJoin(targetRoot, name))
+			except OSError:
+				copyfile(pathJoin(root, name), pathJoin(targetRoot, name))
+########################################################################
+def stageReport(reportPath, keptItems=None):
+	'''
+	Create the directory the new report is built in next to reportPath
+	and return its path. The items of the previous report named in
+	keptItems, or all of them if it is None, are linked into the new
+	report so they can be updated.
+
+	Files moved into the new report with moveFile() that are the same
+	as the file in the previous report are linked instead of written.
+	'''
+	global stagingDirectory
+	global previousDirectory
+	staging = tempfile.mkdtemp(prefix=workspacePrefix+'report-', \
+		dir=dirname(realpath(reportPath)))
+	# the report is read by other users and web servers
+	os.chmod(staging, 0o755)
+	stagingDirectory = realpath(staging)
+	previousDirectory = None
+	if isdir(reportPath):
+		previousDirectory = realpath(reportPath)
+		for item in sorted(os.listdir(previousDirectory)):
+			if keptItems == None or item in keptItems:
+				if isdir(pathJoin(previousDirectory, item)):
+					linkTree(pathJoin(previousDirectory, item), pathJoin(staging, item))
+				else:
+					os.link(pathJoin(previousDirectory, item), pathJoin(staging, item))
+	return stagingDirectory
+########################################################################
+def publishReport(reportPath):
+	'''
+	Swap the finished report in for the previous one. reportPath is a
+	link to the current report and is replaced by a rename, so readers
+	see the old report or the new one and never part of either.
+	'''
+	global stagingDirectory
+	global previousDirectory
+	linkPath = reportPath+'.'+str(os.getpid())+'.link'
+	os.symlink(basename(stagingDirectory), linkPath)
+	# another run may have published a report since this one started so
+	# the report linked now is removed along with the one built from
+	oldDirectories = [previousDirectory]
+	if islink(reportPath):
+		oldDirectories.append(realpath(reportPath))
+	elif isdir(reportPath):
+		# reports made by older versions are a directory, move it out of
+		# the way so the link can take its place
+		oldPath = tempfile.mkdtemp(prefix=workspacePrefix+'report-', \
+			dir=dirname(realpath(reportPath)))
+		os.rename(reportPath, pathJoin(oldPath, 'report'))
+		oldDirectories.append(oldPath)
+	os.rename(linkPath, reportPath)
+	# remove the old reports, readers that still have files open keep them
+	for oldDirectory in oldDirectories:
+		if oldDirectory != None and oldDirectory != stagingDirectory and \
+				basename(oldDirectory).startswith(workspacePrefix):
+			removeWorkspace(oldDirectory)
+	stagingDirectory = None
+	previousDirectory = None
+########################################################################
+def discardReport():
+	'''
+	Remove the report being built if it was not published, the previous
+	report is left as it is.
+	'''
+	global stagingDirectory
+	global previousDirectory
+	if stagingDirectory != None:
+		removeWorkspace(stagingDirectory)
+	stagingDirectory = None
+	previousDirectory = None
+########################################################################
+def copyFile(sourcePath, destinationPath):
+	'''
+	Copy the file at sourcePath to destinationPath through a scratch
+	file so destinationPath is replaced in a single step.
+	'''
+	tempPath = scratchPath(destinationPath)
+	copyfile(sourcePath, tempPath)
+	moveFile(tempPath, destinationPath)
+########################################################################
+def linkFile(sourcePath, destinationPath):
+	'''
+	Put the file at sourcePath, which is never changed in place such as
+	a cache entry, at destinationPath without writing it again. It is
+	hardlinked if it is on the same filesystem, otherwise the file of
+	the previous report is linked if it is the same, and only if
+	neither can be linked is it copied.
+	'''
+	if replaceWithLink(sourcePath, destinationPath):
+		return
+	previousPath = previousFile(destinationPath)
+	if previousPath != False and getsize(previousPath) == getsize(sourcePath) and \
+			filecmp.cmp(sourcePath, previousPath, shallow=False) and \
+			replaceWithLink(previousPath, destinationPath):
+		return
+	copyFile(sourcePath, destinationPath)
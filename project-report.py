@@ -18,11 +18,18 @@
 #########################################################################
 # INDEX
 # - runCmd()
-# - findSources()
-# - cProfile()
+# - makeDirectory()
+# - removePath()
+# - loadProjectTitle()
+# - traceName()
 # - main()
+#   - keptItems()
+#   - buildReport()
+#   - watchProject()
 #   - buildIndex()
+#   - archive()
 #   - trace()
+#   - traceFile()
 #   - pylint()
 #   - pydocs()
 #   - gitlog()
@@ -38,156 +45,160 @@
 # - build spell checker for comment lines
 ########################################################################
 import sys
+import json
 from os import curdir
-from os import popen
 from os import listdir
+from os import makedirs
+from os import remove
+from os.path import basename
+from os.path import isdir
 from os.path import realpath
 from os.path import relpath
-from os.path import isfile
-from os.path import isdir
 from os.path import exists as pathExists
 from os.path import join as pathJoin
-from cgi import escape as escapeHTML
 from markdown import markdown
 from math import ceil
-from multiprocessing import Process
+from shutil import rmtree
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from itertools import chain
+from time import sleep
 # add custom libaries path
 sys.path.append('/usr/share/project-report/')
 # custom libaries
 from files import saveFile
 from files import loadFile
+import commandrunner
+from commandrunner import commandError
+from commandrunner import findProgram
+from commandrunner import runCommand
+from githistory import countCommits
+from githistory import gitDirectory
+from githistory import headCommit
+from githistory import isAncestor
+from githistory import readHistory
+from logreport import logFormat
+from logreport import pageWriter
+from logreport import updateLogPageLinks
+from diskcache import diskCache
+from diskcache import hashFile
+from diskcache import hashKey
+from docreport import documentFiles
+from stacksampler import loadFolded
+from stacksampler import renderFlamegraph
+from stacksampler import renderSampleTable
+from stacksampler import sampleWorker
+from profilereport import callGraph
+from profilereport import profileWorker
+from profilereport import renderProfile
+from gourcevideo import findEncoder
+from gourcevideo import renderVideo
+from gourcevideo import videoPresets
+from gourcevideo import videoSettings
+from repostats import repoStats
+from repostats import renderStats
+from sourcearchive import archiveExtensions
+from sourcearchive import buildArchive
+from sourcearchive import chooseFormat
+from inventory import sourceInventory
+from scheduler import stageScheduler
+from scriptrunner import runWorkers
+from lintreport import countMessages
+from lintreport import lintFiles
+from lintreport import lintRating
+from lintreport import renderMessages
+from umlreport import drawDiagrams
+from workspace import createWorkspace
+from workspace import enterWorkspace
+from workspace import copyFile
+from workspace import discardReport
+from workspace import publishReport
+from workspace import removeWorkspace
+from workspace import stageReport
+from watchmode import repoWatcher
+from watchmode import serveReport
 # setup the debugging object
 import masterdebug
 debug = masterdebug.init()
+# record the resources used by each stage and command
+import timing
 ########################################################################
 # functions and classes
 ########################################################################
-def runCmd(command):
+def runCmd(arguments, **options):
 	'''
-	Shorthand command for using popen(command).read().
+	Shorthand command for using runCommand(arguments).output.
 
-	Runs a command on the terminal and returns the output as a
-	string.
+	Runs a command given as a list of arguments without a shell and
+	returns the output as a string. The options are passed on to
+	runCommand() so the output can be streamed to a file instead, in
+	that case an empty string is returned.
 	'''
-	debug.add('Running command',command)
-	commandObject = popen(command)
-	output = commandObject.read()
+	result = runCommand(arguments, debug=debug, **options)
+	if result.output == None:
+		return ''
 	# print the output of the command for debug
-	debug.add('Command output',output)
+	debug.add('Command output',result.output)
 	# return the output of the comand
-	return output
-#######################################################################
-def findSources(directory, sourceExtension, ignoreList=None):
+	return result.output
+########################################################################
+def makeDirectory(path):
 	'''
-	Find source files in a directory recursively. Return an array
-	containing the full path to each of source files found.
-
-	directory would be a string defining the directory to search
-	through recursively
-	sourceExtension is a string in the form of ".py" so some more
-	examples would be ".sh",".js",".cpp",".css",".html"
+	Create the directory at path along with any missing parent
+	directories, the same as "mkdir -p".
 	'''
-	# remove leading . in sourceExtension
-	sourceExtension = sourceExtension.replace('.','')
-	# sources array stores search results
-	sourcesArray = []
-	# get all items in the directory
-	directoryItems = listdir(directory)
-	# for each location (file or directory) in this directory
-	for location in directoryItems:
-		# get the absolute location
-		location=realpath(pathJoin(directory,location))
-		if isfile(location):
-			# check if the file is a selected source type
-			if '.' in location:
-				if sourceExtension == location.split('.')[1]:
-					# this is a file, append it to the returned files
-					sourcesArray.append(realpath(pathJoin(directory, location)))
-		elif isdir(location):
-			# this is a directory so go deeper
-			sourcesArray += findSources(pathJoin(directory, location), sourceExtension)
-	# remove all sources that match the ignore list
-	finalArray = list()
-	# read through all file paths found in the search and check that they do not
-	# match any items in the ignoreList array
-	for location in sourcesArray:
-		debug.add('Checking location',location)
-		# check that the location is not already in the list
-		# e.g. prevent duplicates
-		if location not in finalArray and location != '':
-			debug.add('Location does not already exist and is not blank')
-			tempLocation = realpath(pathJoin(directory, location))
-			addLocation = True
-			# check if the ignore list has been set
-			if ignoreList != None:
-				debug.add('An ignore list was set')
-				for ignoreItem in ignoreList:
-					debug.add('Checking ignoreList item', ignoreItem)
-					# check if the item to be added matches the ignore list
-					# if no match is found add the item
-					if ignoreItem in location:
-						debug.add('Item was found in location', location)
-						debug.add('Item will be ignored')
-						# this is a file, append it to the returned files
-						addLocation = False
-			# if no matches were found in the location for ignore strings
-			if addLocation:
-				# add tempLocation to the finalArray output
-				finalArray.append(tempLocation)
-	# this function is dumb and has no false return values
-	return finalArray
+	if not isdir(path):
+		makedirs(path)
 ########################################################################
-def cProfile(projectDirectory, filePath, sortMethod='cumtime'):
+def removePath(path):
 	'''
-	Run cProfile and convert the output into a html table
+	Remove the file or directory tree at path if it exists, the same as
+	"rm -r".
 	'''
-	cProfileOutput = runCmd('python -m cProfile -s '+sortMethod+' '+pathJoin(projectDirectory,relpath(filePath)))
-	outputStarted = False
-	returnOutput = '<table>\n'
-	cProfileOutput = cProfileOutput.split('\n')
-	for line in cProfileOutput:
-		# if output is started and line is not blank
-		if outputStarted and line != '':
-			# add the line to the return output
-			returnOutput +=	formatProfileLine(line)
-		else:
-			if 'ncalls' in line:
-				# formate the line as the header
-				line = formatProfileLine(line,'<th>','</th>')
-				# add line to returnOutput
-				returnOutput += line
-				# set the output started flag to be true
-				outputStarted = True
-	# close the table tag
-	returnOutput += '</table>\n'
-	# return cProfile output converted into HTML
-	return returnOutput
+	debug.add('Removing',path)
+	if isdir(path):
+		rmtree(path)
+	elif pathExists(path):
+		remove(path)
+########################################################################
+def traceName(filePath):
+	'''
+	Return the name used for the pages of a trace file, the file name
+	without the .py extension.
+	'''
+	fileName = basename(filePath)
+	if fileName.endswith('.py'):
+		fileName = fileName[:-3]
+	return fileName
 ########################################################################
-def formatProfileLine(line, openTag='<td>', closeTag='</td>'):
+def loadLogState(statePath):
 	'''
-	OpenTag and CloseTag can be changed to set headers and regular data
+	Load the git log state saved by the last run. Return False if there
+	is no usable state.
 	'''
-	while '  ' in line:
-		# replace multuple lines of whitespace with a single
-		# tab of whitespace
-		line = line.replace('  ',' ')
-	# insert orignal line as a comment
-	tempLine = '\t<!-- '+str(line)+' -->\n'
-	# split the line based on single spaces
-	line = line.split(' ')
-	# remove empty entries at the begining of the line
-	if line[0] == '':
-		line.pop(0)
-	tempLine += '\t<tr>\n'
-	for index in range(4):
-		# check that the line is long enough to work and ignore blank lines
-		if len(line) > 4 and line[index] != '':
-			# create a cell in html for each data point in the cProfile ouput
-			tempLine += '\t\t'+openTag+escapeHTML(line[index])+closeTag+'\n'
-	tempLine += '\t\t'+openTag+escapeHTML(' '.join(line[5:]))+closeTag+'\n'
-	tempLine += '\t</tr>\n'
-	# return the cleaned up line output
-	return tempLine
+	if not pathExists(statePath):
+		return False
+	stateContent = loadFile(statePath)
+	if stateContent == False:
+		return False
+	try:
+		state = json.loads(stateContent)
+	except ValueError:
+		debug.warning('Git log state is corrupt',statePath)
+		return False
+	for key in ('head','pageSize','maxDiffLines','pages'):
+		if key not in state:
+			return False
+	return state
+########################################################################
+def loadProjectTitle(projectDirectory):
+	'''
+	Return the project title from the README.md in projectDirectory or
+	False if there is no README.md.
+	'''
+	if pathExists(pathJoin(projectDirectory,'README.md')):
+		return loadFile(pathJoin(projectDirectory,'README.md')).split('===')[0].strip()
+	return False
 ########################################################################
 class main():
 	def __init__(self,arguments):
@@ -198,6 +209,7 @@ class main():
 		runGitLog = True
 		runGitStats = True
 		runGource = True
+		runArchive = True
 		# create a list to store files that will have a trace ran on them
 		self.traceFiles=list()
 		# noDelete is a flag to not delete previously generated report
@@ -206,9 +218,46 @@ class main():
 		self.ignoreList=list()
 		# create the max trace depth default of 5
 		self.maxTraceDepth=5
+		# the max number of lines of a single diff shown in the git log
+		self.maxDiffLines=5000
+		# the number of commits on each page of the git log
+		self.logPageSize=10
+		# the number of pages linked on each side of a git log page
+		self.logPageWindow=5
+		# the directory and size in bytes of the cache kept between runs
+		self.cacheDirectory=None
+		self.cacheBytes=500*1024*1024
+		# the number of cpu cores shared by all of the stages of the report
+		self.jobs=cpu_count()
+		# the seconds a single command can run before it is killed and the
+		# max memory in bytes of a single command, None is no limit
+		self.commandTimeout=2*60*60
+		self.memoryLimit=None
+		# the compressor and compression level used for the source download,
+		# None uses the default level of the compressor
+		self.archiveFormat='gzip'
+		self.archiveLevel=None
+		# the preset for the gource video and any settings that replace the
+		# preset values
+		self.videoPreset='high'
+		self.videoResolution=None
+		self.videoFps=None
+		self.videoQuality=None
+		self.videoSegments=None
 		# the sortmethod for the trace, below is a link to the documentation on sort methods
 		# https://docs.python.org/3.5/library/profile.html#pstats.Stats.sort_stats
 		self.traceSortMethod='cumtime'
+		# profile traces with cProfile or with the stack sampler, and the
+		# number of samples taken each second by the sampler
+		self.traceMode='profile'
+		self.sampleRate=100
+		# stay running and build the report again when the refs change, the
+		# refs are polled every watchInterval seconds without inotify
+		self.watch=False
+		self.watchInterval=2
+		# the port the report is served on instead of opening it, None
+		# opens the report with exo-open
+		self.servePort=None
 		# remove the script path from arguments
 		del arguments[0]
 		# if no arguments are defined then set the directory to the current
@@ -227,6 +276,16 @@ class main():
 				print('    Display this menu')
 				print('--nodelete')
 				print('    Do not delete previously generated report before making this one.')
+				print('--watch')
+				print('    Stay running and build the report again when new commits')
+				print('    are made, only the parts of the report that changed are')
+				print('    built again.')
+				print('--watch-interval')
+				print('    Set the seconds between checks of the refs when inotify')
+				print('    can not be used, the default is 2.')
+				print('--serve')
+				print('    Serve the report on http://127.0.0.1 instead of opening')
+				print('    it, the port can be given and the default is 8000.')
 				print('--output')
 				print('    Will set the output directory to generate the /report/ in')
 				print('--projectdir')
@@ -239,13 +298,80 @@ class main():
 				print('    ex) project-report --trace main.py')
 				print('    You can add multuple files to the trace report')
 				print('    ex) project-report --trace main.py --trace other.py')
+				print('--max-diff-lines')
+				print('    Set the max number of lines shown for the diff of a')
+				print('    single commit in the git log, the default is 5000.')
+				print('--cache')
+				print('    Set the directory results are cached in between runs.')
+				print('    The default is ~/.cache/project-report/')
+				print('--cache-size')
+				print('    Set the max size of each part of the cache in megabytes,')
+				print('    the default is 500.')
+				print('--jobs')
+				print('    Set the number of cpu cores the report can use at once,')
+				print('    the default is the number of cpus. Stages and the tools')
+				print('    they run share these cores.')
+				print('--timeout')
+				print('    Set the max number of seconds a single command, trace')
+				print('    or documented module can run before it is killed, the')
+				print('    default is 7200. Use 0 for no limit. The git history')
+				print('    and the gource video take as long as the project is')
+				print('    large so they are not limited.')
+				print('--memory-limit')
+				print('    Set the max memory in megabytes a single command can')
+				print('    use, there is no limit by default.')
+				print('--archive-format')
+				print('    Set the format of the source code download, one of')
+				print('    gzip, zstd, xz, 7z or zip. The default is gzip which')
+				print('    uses pigz when it is installed.')
+				print('--archive-level')
+				print('    Set the compression level of the source code download.')
+				print('--video-preset')
+				print('    Set the quality of the gource video, one of high, medium')
+				print('    or low. The default is high.')
+				print('--video-resolution')
+				print('    Set the resolution of the gource video e.g. 1920x1080.')
+				print('--video-fps')
+				print('    Set the frame rate of the gource video, 25, 30 or 60.')
+				print('--video-quality')
+				print('    Set the crf of the gource video, lower is better and')
+				print('    larger.')
+				print('--video-segments')
+				print('    Set the number of date ranges the gource video is split')
+				print('    into and rendered in parallel, the default is one for')
+				print('    each core given to the video. The view starts over at')
+				print('    each join, 1 gives one unbroken video.')
+				print('--log-page-size')
+				print('    Set the number of commits shown on each page of the')
+				print('    git log, the default is 10.')
 				print('--maxTraceDepth')
 				print('    Set the max depth to trace execution of a file.')
+				print('--trace-mode')
+				print('    Set how trace files are profiled, "profile" runs them')
+				print('    under cProfile and draws a call graph, "sampling" takes')
+				print('    samples of the stack and draws a flamegraph with much')
+				print('    less overhead. The default is profile.')
+				print('--sample-rate')
+				print('    Set the number of stack samples taken each second in')
+				print('    the sampling trace mode, the default is 100.')
 				print('--traceSortMethod')
 				print('    The method to sort trace results by. This can be')
 				print('    "ncalls" or "time" to sort by the number of times')
 				print('    a function is called, or by the time the function')
 				print('    requires to run.')
+				print('--debug')
+				print('    Show debug messages while the report is generated.')
+				print('--debug-level')
+				print('    Only show messages at this level or above, one of')
+				print('    debug, info, warning or error.')
+				print('--debug-lines')
+				print('    The number of the newest debug messages kept in memory,')
+				print('    the default is 1000.')
+				print('--debug-width')
+				print('    Cut debug messages down to this many characters, the')
+				print('    default is 500.')
+				print('--debug-file')
+				print('    Also append every debug message to this file as json lines.')
 				print('--disable')
 				print('    Disable modules ran in the report')
 				print('    Modules are')
@@ -255,11 +381,63 @@ class main():
 				print('    - gitlog')
 				print('    - gitstats')
 				print('    - gource')
+				print('    - archive')
 				print('#'*80)
 				exit()
 			if 'tracesortmethod' == argument[0]:
 				# set the trace sort method
 				self.traceSortMethod = argument[1]
+			if 'max-diff-lines' == argument[0]:
+				# set the max number of diff lines for each commit
+				self.maxDiffLines = int(argument[1])
+			if 'cache' == argument[0]:
+				# set the cache directory
+				self.cacheDirectory = argument[1]
+			if 'cache-size' == argument[0]:
+				# set the max size of the cache in megabytes
+				self.cacheBytes = int(argument[1])*1024*1024
+			if 'jobs' == argument[0]:
+				# set the number of worker processes
+				self.jobs = max(1, int(argument[1]))
+			if 'timeout' == argument[0]:
+				# set the max run time of each command
+				self.commandTimeout = int(argument[1]) or None
+			if 'memory-limit' == argument[0]:
+				# set the max memory of each command in megabytes
+				self.memoryLimit = int(argument[1])*1024*1024
+			if 'archive-format' == argument[0]:
+				# set the compressor used for the source download
+				if argument[1] in archiveExtensions:
+					self.archiveFormat = argument[1]
+			if 'archive-level' == argument[0]:
+				# set the compression level of the source download
+				self.archiveLevel = int(argument[1])
+			if 'video-preset' == argument[0]:
+				# set the preset used for the gource video
+				if argument[1] in videoPresets:
+					self.videoPreset = argument[1]
+			if 'video-resolution' == argument[0]:
+				# set the resolution of the gource video
+				self.videoResolution = argument[1]
+			if 'video-fps' == argument[0]:
+				# set the frame rate of the gource video
+				self.videoFps = int(argument[1])
+			if 'video-quality' == argument[0]:
+				# set the crf of the gource video
+				self.videoQuality = int(argument[1])
+			if 'video-segments' == argument[0]:
+				# set the number of segments of the gource video
+				self.videoSegments = max(1, int(argument[1]))
+			if 'log-page-size' == argument[0]:
+				# set the number of commits on each git log page
+				self.logPageSize = max(1, int(argument[1]))
+			if 'trace-mode' == argument[0]:
+				# set how the trace files are profiled
+				if argument[1] in ('profile', 'sampling'):
+					self.traceMode = argument[1]
+			if 'sample-rate' == argument[0]:
+				# set the samples taken each second by the sampler
+				self.sampleRate = max(1, int(argument[1]))
 			if 'maxtracedepth' == argument[0]:
 				# set the max trace depth to the number
 				self.maxTraceDepth = argument[1]
@@ -268,6 +446,17 @@ class main():
 				self.traceFiles.append(argument[1])
 			if 'nodelete' == argument[0]:
 				noDelete = True
+			if 'watch' == argument[0]:
+				# build the report again on new commits
+				self.watch = True
+			if 'watch-interval' == argument[0]:
+				# set the seconds between checks of the refs
+				self.watchInterval = max(1, int(argument[1]))
+			if 'serve' == argument[0]:
+				# serve the report instead of opening it
+				self.servePort = 8000
+				if len(argument) > 1 and argument[1].isdigit():
+					self.servePort = int(argument[1])
 			if 'output' == argument[0]:
 				projectDirectory=argument[1]
 			if 'projectdir' == argument[0]:
@@ -292,64 +481,240 @@ class main():
 					runGitStats = False
 				elif argument[1] == 'gource':
 					runGource = False
-		# remove previous reports
+				elif argument[1] == 'archive':
+					runArchive = False
+		# every command run by the report is limited by these, the stages
+		# are forked so they share the settings
+		commandrunner.defaultTimeout = self.commandTimeout
+		commandrunner.defaultMemoryLimit = self.memoryLimit
+		# the name of the source download linked from the index
+		projectTitle = loadProjectTitle(projectDirectory)
+		if projectTitle:
+			projectTitle = projectTitle.replace(' ','_')
+		else:
+			projectTitle = 'source'
+		self.archiveName = projectTitle+archiveExtensions[chooseFormat(self.archiveFormat, self.jobs)]
+		self.archivePrefix = projectTitle+'/'
+		# find the video encoder once instead of running gource to find out
+		self.videoEncoder = findEncoder()
+		if runGource == True and (self.videoEncoder == False or not findProgram('gource')):
+			debug.warning('gource and ffmpeg or avconv are needed for the video')
+			runGource = False
+		# the stages that make up the report
+		self.stageNames = set(name for name, enabled in (('buildIndex', runBuildIndex), \
+			('runLint', runLint), ('runDocs', runDocs), ('runGitLog', runGitLog), \
+			('runGitStats', runGitStats), ('runGource', runGource), \
+			('runArchive', runArchive), ('trace', len(self.traceFiles) > 0)) if enabled)
+		# find the project files once for all of the stages
+		self.inventory = sourceInventory(projectDirectory, self.ignoreList)
+		if self.watch:
+			self.watchProject(projectDirectory, noDelete)
+			return
+		# the log and stats of the previous report are kept so only new
+		# commits need to be read
+		keptItems = None
 		if not noDelete:
-			if pathExists('report/'):
-				runCmd("rm -vr report/")
-		# create a source backup of the project
-		runCmd("7z a -mx=9 source.7z ./")
+			keptItems = self.keptItems(self.stageNames)
+		if not self.buildReport(projectDirectory, self.stageNames, keptItems):
+			# the previous report is left in place
+			sys.exit(1)
+		if self.servePort != None:
+			# serve the report until the server is stopped
+			server = serveReport('report', self.servePort, debug)
+			print('Serving the report at http://127.0.0.1:'+str(self.servePort)+'/')
+			try:
+				while True:
+					sleep(60)
+			except KeyboardInterrupt:
+				server.shutdown()
+		else:
+			# launch the generated website
+			runCmd(['exo-open', 'report/index.html'])
+	#######################################################################
+	def keptItems(self, stageNames):
+		'''
+		Return the names of the items of the previous report that are
+		carried into a report built by the stages in stageNames. The log
+		and stats are kept so they can be updated and the output of the
+		stages that are not run again is kept as it is.
+		'''
+		stageItems = {
+			'buildIndex': ['index.html'],
+			'runLint': ['lint'],
+			'runDocs': ['docs'],
+			'runGitLog': ['log'],
+			'runGitStats': ['webstats'],
+			'runGource': ['video.mp4'],
+			'runArchive': [self.archiveName],
+			'trace': ['trace']
+		}
+		items = list()
+		for name in self.stageNames:
+			if name not in stageNames or name in ('runGitLog', 'runGitStats'):
+				items += stageItems[name]
+		return items
+	#######################################################################
+	def buildReport(self, projectDirectory, stageNames, keptItems=None):
+		'''
+		Run the stages named in stageNames and swap the report they build in
+		for the previous report. The items of the previous report named in
+		keptItems, or all of them if it is None, are carried into the new
+		report.
+
+		Return True if the report was published, if any stage failed the
+		new report is thrown away and False is returned.
+		'''
+		# the report is built in a new directory that replaces the previous
+		# report when it is finished
+		self.reportDirectory = stageReport('report', keptItems)
 		# create the directories that the report will be stored in
-		runCmd("mkdir -p report")
-		runCmd("mkdir -p report/webstats")
-		runCmd("mkdir -p report/lint")
-		runCmd("mkdir -p report/trace")
-		runCmd("mkdir -p report/log")
+		makeDirectory(pathJoin(self.reportDirectory,'webstats'))
+		makeDirectory(pathJoin(self.reportDirectory,'lint'))
+		makeDirectory(pathJoin(self.reportDirectory,'trace'))
+		makeDirectory(pathJoin(self.reportDirectory,'log'))
 		# copy the logo into the report
-		runCmd("cp -v logo.png report/logo.png")
-		# create an array to manage the processes
-		work = list()
-		# begin running modules for project-report
-		if runLint == True:
-			work.append(Process(name='runLint',target=self.pylint,args=(projectDirectory,)))
-		if runDocs == True:
-			work.append(Process(name='runDocs',target=self.pydocs, args=(projectDirectory,)))
-		if len(self.traceFiles) > 0:
-			work.append(Process(name='trace',target=self.trace, args=(projectDirectory,)))
-		if runGitLog == True:
-			work.append(Process(name='runGitLog',target=self.gitLog))
-		if runGitStats == True:
-			work.append(Process(name='runGitStats',target=self.gitStats))
-		if runGource == True:
-			work.append(Process(name='runGource',target=self.gource))
-		# start all processes
-		for job in work:
-			job.start()
-		activeProcesses = True
-		# wait till all processes are complete
-		while activeProcesses:
-			activeProcesses = False
-			for job in work:
-				if job.is_alive():
-					activeProcesses = True
-		# the index must be built last since it pulls data from some
-		# of the previously generated things
-		if runBuildIndex == True:
-			self.buildIndex(projectDirectory)
-		# cleanup the .pyc files
-		for source in findSources(projectDirectory,'.pyc',self.ignoreList):
-			runCmd('rm -v '+source)
-		# launch the generated website
-		runCmd("exo-open report/index.html")
+		if pathExists('logo.png'):
+			copyFile('logo.png', pathJoin(self.reportDirectory,'logo.png'))
+		# temporary files of every stage are kept in a workspace of this
+		# run, so reports and workers running at once never share files
+		self.workspace = createWorkspace(curdir)
+		# every stage and command records its resource use in this file
+		timing.timingFile = pathJoin(self.reportDirectory,'timings.jsonl')
+		removePath(timing.timingFile)
+		# stages are run by the scheduler once the stages they depend on
+		# are finished, without using more than --jobs cpu cores
+		stages = stageScheduler(self.jobs, debug)
+		# begin running modules for project-report, the gource video takes
+		# the longest so it is started first
+		if 'runGource' in stageNames:
+			stages.add('runGource', self.runStage, (self.gource,), \
+				priority=30, cores=max(1, self.jobs // 2))
+		if 'runGitLog' in stageNames:
+			stages.add('runGitLog', self.runStage, (self.gitLog,), \
+				priority=20, cores=self.jobs)
+		if 'runLint' in stageNames:
+			stages.add('runLint', self.runStage, (self.pylint, projectDirectory), \
+				priority=10, cores=self.jobs)
+		if 'runDocs' in stageNames:
+			stages.add('runDocs', self.runStage, (self.pydocs, projectDirectory), \
+				priority=10, cores=self.jobs)
+		if 'trace' in stageNames:
+			stages.add('trace', self.runStage, (self.trace, projectDirectory), \
+				priority=10, cores=min(self.jobs, len(self.traceFiles)))
+		if 'runGitStats' in stageNames:
+			stages.add('runGitStats', self.runStage, (self.gitStats,), \
+				priority=10)
+		if 'runArchive' in stageNames:
+			stages.add('runArchive', self.runStage, (self.archive, projectDirectory), \
+				priority=20, cores=self.jobs)
+		# the index must be built after the stages it pulls data from
+		if 'buildIndex' in stageNames:
+			stages.add('buildIndex', self.runStage, (self.buildIndex, projectDirectory), \
+				depends=['runLint', 'runGitLog', 'runGitStats', 'trace', 'runGource', \
+					'runArchive'])
+		try:
+			exitCodes = stages.run()
+			failedStages = sorted(name for name, exitCode in exitCodes.items() if exitCode != 0)
+			if len(failedStages) > 0:
+				debug.error('Stages failed, the report was not published',failedStages)
+				return False
+			# gather the timing records from all of the stages into the report
+			timingRecords = timing.collectTimings(pathJoin(self.reportDirectory,'timings.json'))
+			# commands run after this are not part of the report
+			timing.timingFile = None
+			saveFile(pathJoin(self.reportDirectory,'timings.html'), timing.renderTimings(timingRecords))
+			# swap the finished report in for the previous one
+			publishReport('report')
+			return True
+		finally:
+			timing.timingFile = None
+			removeWorkspace(self.workspace)
+			# a report that failed to finish is thrown away
+			discardReport()
+	#######################################################################
+	def watchProject(self, projectDirectory, noDelete=False):
+		'''
+		Stay running and build the report again each time the refs of the
+		repository change. Only the stages whose inputs changed are run,
+		the history stages when HEAD moves and the source stages when the
+		python files change, the rest is carried over from the previous
+		report.
+
+		The stages are forked from this process so the modules, the
+		inventory and the caches they fill are already loaded.
+		'''
+		# the stages that read the history and the stages that read the
+		# python files of the working tree
+		historyStages = set(['runGitLog', 'runGitStats', 'runGource', 'runArchive'])
+		sourceStages = set(['runLint', 'runDocs', 'trace'])
+		gitPath = gitDirectory(projectDirectory)
+		if gitPath == False:
+			debug.error('Watching needs a git repository',projectDirectory)
+			return
+		server = None
+		if self.servePort != None:
+			server = serveReport('report', self.servePort, debug)
+			print('Serving the report at http://127.0.0.1:'+str(self.servePort)+'/')
+		watcher = repoWatcher(gitPath, self.watchInterval)
+		# the first report is built the same way as without watching
+		runStages = set(self.stageNames)
+		keptItems = None
+		if not noDelete:
+			keptItems = self.keptItems(runStages)
+		lastHead = headCommit(projectDirectory)
+		lastSources = self.inventory.stamp('.py')
+		try:
+			while True:
+				# stages of a report that failed are run again with the next one
+				retryStages = set()
+				if len(runStages) > 0:
+					debug.info('Building the report',sorted(runStages))
+					if not self.buildReport(projectDirectory, runStages, keptItems):
+						retryStages = runStages
+				watcher.wait()
+				# find what changed since the last report
+				self.inventory.scan()
+				head = headCommit(projectDirectory)
+				sources = self.inventory.stamp('.py')
+				runStages = set(retryStages)
+				if head != lastHead:
+					runStages.update(historyStages)
+				if sources != lastSources:
+					runStages.update(sourceStages)
+				runStages.intersection_update(self.stageNames)
+				if len(runStages) > 0 and 'buildIndex' in self.stageNames:
+					runStages.add('buildIndex')
+				keptItems = self.keptItems(runStages)
+				lastHead = head
+				lastSources = sources
+		except KeyboardInterrupt:
+			pass
+		finally:
+			watcher.close()
+			if server != None:
+				server.shutdown()
+	#######################################################################
+	def runStage(self, target, *arguments, **options):
+		'''
+		Run a stage of the report inside of the process started for it by
+		the scheduler. The number of cpu cores given to the stage is used
+		as the number of jobs for the tools the stage runs.
+		'''
+		self.jobs = options.get('jobs', self.jobs)
+		# the temporary files of the stage go in its own directory
+		enterWorkspace(target.__name__)
+		# record the time and resources used by the stage
+		timing.currentStage = target.__name__
+		start = timing.startTimer()
+		target(*arguments)
+		timing.recordStage(target.__name__, start)
 	#######################################################################
 	def buildIndex(self,projectDirectory):
 		'''
 		Builds the index page of the report website.
 		'''
 		# grab the project title from the readme
-		if pathExists(pathJoin(projectDirectory,'README.md')):
-			projectTitle = loadFile(pathJoin(projectDirectory,'README.md')).split('===')[0].strip()
-		else:
-			projectTitle = False
+		projectTitle = loadProjectTitle(projectDirectory)
 		# create the index page to be saved to report/index.html
 		reportIndex  = "<html>\n"
 		reportIndex += "<head>\n"
@@ -368,28 +733,28 @@ class main():
 			reportIndex += "<h1 style='text-align: center'>\n"
 			reportIndex += projectTitle
 			reportIndex += "</h1>\n"
-			reportIndex += "<div id='date'>Created on "+runCmd('date')+"</div>\n"
+			reportIndex += "<div id='date'>Created on "+runCmd(['date'])+"</div>\n"
 		# add the menu items
 		reportIndex += "<div id='menu'>\n"
-		if pathExists(pathJoin(projectDirectory,'report','webstats','index.html')):
+		if pathExists(pathJoin(self.reportDirectory,'webstats','index.html')):
 			reportIndex += "<a class='menuButton' href='webstats/index.html'>Stats</a>\n"
-		if pathExists(pathJoin(projectDirectory,'report','log/log.html')):
+		if pathExists(pathJoin(self.reportDirectory,'log/log.html')):
 			reportIndex += "<a class='menuButton' href='log/log.html'>Log & Diff</a>\n"
 		reportIndex += "<a class='menuButton' href='docs/'>Docs</a>\n"
-		if pathExists(pathJoin(projectDirectory,'report','lint','index.html')):
+		if pathExists(pathJoin(self.reportDirectory,'lint','index.html')):
 			reportIndex += "<a class='menuButton' href='lint/index.html'>Lint</a>\n"
 		reportIndex += "</div>\n"
 		# add video to webpage
 		reportIndex += "<video src='video.mp4' poster='logo.png' width='800' controls>\n"
 		reportIndex += "<a href='video.mp4'>Gource Video Rendering</a>\n"
 		reportIndex += "</video>\n"
-		if pathExists(pathJoin(projectDirectory,'report','lint','index.html')):
-			# find the reported quality of all code in the repo
-			tempQuality = loadFile(pathJoin(realpath(projectDirectory),'report','lint','index.html'))
-			debug.add('Quality search string',tempQuality)
-			searchString = 'code has been rated at '
-			tempQuality = tempQuality[tempQuality.find(searchString)+len(searchString):]
-			tempQuality = tempQuality[:tempQuality.find('/')]
+		# the score is only there when the lint stage ran
+		lintScore = False
+		if pathExists(pathJoin(self.reportDirectory,'lint','score.json')):
+			lintScore = json.loads(loadFile(pathJoin(self.reportDirectory,'lint','score.json')))
+		if lintScore != False and lintScore['rating'] != None:
+			# the rating is saved by the lint stage
+			tempQuality = lintScore['rating']
 			debug.add('Calculated Code quality',tempQuality)
 			# get the percentage
 			tempQuality = (float(tempQuality)/10)*100
@@ -415,18 +780,12 @@ class main():
 				reportIndex += "<div class='qualityBar' style='background-color: "+tempColor+";width:"+str(int(tempQuality)*8)+"px;text-align: center;'>\n"
 				reportIndex += "<span>Code Quality : "+str(int(tempQuality))+"%</span>\n"
 				reportIndex += "</div>\n"
-		if pathExists(pathJoin(projectDirectory,'report','trace','index.html')):
+		if pathExists(pathJoin(self.reportDirectory,'trace','index.html')):
 			reportIndex += "<div id='traceAndSourceButtons'>\n"
 			reportIndex += "<a id='traceReportButton' class='menuButton' href='trace/index.html'>Trace Report</a>\n"
-		if projectTitle:
-			projectTitle=projectTitle.replace(' ','_')
-			runCmd('mv source.7z report/'+projectTitle+'.7z')
-			reportIndex += "<a id='downloadButton' class='button' href='"+projectTitle+".7z'>Download Source Code</a>\n"
-		else:
-			projectTitle='source'
-			runCmd('mv source.7z report/'+projectTitle+'.7z')
-			reportIndex += "<a id='downloadButton' class='button' href='"+projectTitle+".7z'>Download Source Code</a>\n"
-		if pathExists(pathJoin(projectDirectory,'report','trace','index.html')):
+		if pathExists(pathJoin(self.reportDirectory,self.archiveName)):
+			reportIndex += "<a id='downloadButton' class='button' href='"+self.archiveName+"'>Download Source Code</a>\n"
+		if pathExists(pathJoin(self.reportDirectory,'trace','index.html')):
 			reportIndex += '</div>\n'
 		reportIndex += "<div>\n"
 		# generate the markdown of the README.md file and insert it, if it exists
@@ -437,21 +796,49 @@ class main():
 				fileContent=markdown(fileContent.split('===\n')[1])
 				reportIndex += fileContent
 			reportIndex += "\n</div>\n"
+		# the timing page is written once all of the stages are finished
+		reportIndex += "<div id='timings'><a href='timings.html'>Report Timings</a></div>\n"
 		reportIndex += "</body>\n</html>\n"
 		# write the file
-		saveFile('report/index.html', reportIndex)
+		saveFile(pathJoin(self.reportDirectory,'index.html'), reportIndex)
+	#######################################################################
+	def archive(self,projectDirectory):
+		'''
+		Build the source code download from the files committed at HEAD.
+		'''
+		if not buildArchive(projectDirectory, pathJoin(self.reportDirectory,self.archiveName), \
+				self.archiveFormat, self.archiveLevel, self.jobs, \
+				self.archivePrefix, self.cacheDirectory, self.cacheBytes, debug):
+			debug.warning('Failed to build the source archive',self.archiveName)
 	#######################################################################
 	def trace(self,projectDirectory):
 		'''
-		Run pycallgraph for each .py file found inside of the project directory.
-		This will create a .png graph visually showing execution of the python
-		file.
+		Profile each trace file once and build a call graph and a profile
+		table for it from the same stats. The call graph is a .png graph
+		visually showing execution of the python file.
 		'''
 		debug.add('Starting trace process...')
 		# get the real path of the project directory
 		projectDirectory = realpath(projectDirectory)
 		# get the list of all the traceFiles
 		sourceFiles = self.traceFiles
+		# each trace file runs in its own process, the processes are started
+		# from this thread so they are not forked while other threads run
+		workers = list()
+		for filePath in sourceFiles:
+			tracePath = pathJoin(self.reportDirectory,'trace',traceName(filePath))
+			scriptPath = pathJoin(projectDirectory,relpath(filePath))
+			if self.traceMode == 'sampling':
+				workers.append(sampleWorker(scriptPath, tracePath+'.folded', self.sampleRate))
+			else:
+				workers.append(profileWorker(scriptPath, tracePath+'.prof'))
+		recorded = runWorkers(workers, self.jobs, commandrunner.defaultTimeout)
+		# the pages and graphs are built from the recorded data at once
+		pool = ThreadPool(max(1, min(self.jobs, len(sourceFiles))))
+		traceResults = pool.map(lambda item: self.traceFile(projectDirectory, *item), \
+			zip(sourceFiles, recorded))
+		pool.close()
+		pool.join()
 		# generate the pylint index file
 		traceIndex  = "<html><style>"
 		traceIndex += "td{border-width:3px;border-style:solid;}"
@@ -463,39 +850,22 @@ class main():
 		traceIndex += "<h1 id='#index'>Index</h1><hr />"
 		for filePath in sourceFiles:
 			# pull filename out of the filepath and generate a directory file link
-			fileName=filePath.split('/').pop()
-			fileName=fileName.split('.')[0]
+			fileName=traceName(filePath)
 			# write the index link
 			traceIndex += '<a href="'+fileName+'.html">'+fileName+'</a><br />'
 		traceIndex += "<hr />"
 		traceIndex += "</div>"
-		# grab the first filename to place it as the index in the trace section
-		filePath = sourceFiles[0]
-		# pull filename out of the filepath and generate a directory file link
-		fileName=filePath.split('/').pop()
-		fileName=fileName.split('.')[0]
-		# add a pylint file for the project directory including all lint stuff inside
-		runCmd('pycallgraph --max-depth '+str(self.maxTraceDepth)\
-			+' graphviz --output-file='+pathJoin(relpath(projectDirectory),'report','trace','index.png')\
-			+' '+pathJoin(projectDirectory,filePath))
-		# build the image and link to the image file
-		traceIndex += '<a href="index.png"><img style="width:90%;height:90%" src="index.png" /></a>'
-		traceIndex += "<hr />"
-		traceIndex += '<div><pre>'
-		# generate the cprofile output for the trace file
-		traceIndex += cProfile(projectDirectory, filePath, self.traceSortMethod)
-		traceIndex += '</pre></div>'
+		# the first file is shown as the index in the trace section, its
+		# results are reused instead of tracing it again
+		traceIndex += traceResults[0]
 		traceIndex += '</body></html>'
 		# save the created index file
-		saveFile(pathJoin(projectDirectory,'report/trace/index.html'), traceIndex)
+		saveFile(pathJoin(self.reportDirectory,'trace','index.html'), traceIndex)
 		# generate the individual files
-		for filePath in sourceFiles:
-			# grab the filename by spliting the path and poping the last element
-			fullFileName=filePath.split('/').pop()
-			# remove .py from the fileName to make adding the html work
-			fileName=fullFileName[:(len(fullFileName)-3)]
-			debug.add('Generating pylint report for file',filePath)
-			# run pylint on the code and generate related page
+		for filePath, traceResult in zip(sourceFiles, traceResults):
+			fileName=traceName(filePath)
+			debug.add('Generating trace report for file',filePath)
+			# build the trace page from the profile
 			traceFile  = "<html><style>"
 			traceFile += "td{border-width:3px;border-style:solid;}"
 			traceFile += "th{border-width:3px;border-style:solid;"
@@ -508,38 +878,111 @@ class main():
 			# build the index linking to all other lint files
 			for indexFilePath in sourceFiles:
 				# pull the filename without the extension out of the indexfilepath
-				indexFileName=indexFilePath.split('/').pop()
-				indexFileName=indexFileName[:(len(indexFileName)-3)]
+				indexFileName=traceName(indexFilePath)
 				# building the link index
 				traceFile += '<a href="'+indexFileName+'.html">'+indexFileName+'</a><br />'
 			traceFile += "<hr />"
 			traceFile += "</div>"
-			# build the image and link to the image file
-			traceFile += '<a href="'+fileName+'"><img style="width:90%;height:90%" src='+fileName+'.png /></a>'
-			# building the graph
-			runCmd('pycallgraph --max-depth '+str(self.maxTraceDepth)+\
-				' graphviz --output-file='+pathJoin(relpath(projectDirectory),'report','trace',(fileName+'.png'))+\
-				' '+pathJoin(projectDirectory,filePath))
-			traceFile += "<hr />"
-			traceFile += '<div><pre>'
-			# generate the cprofile output for the trace file
-			traceFile += cProfile(projectDirectory, filePath)
-			traceFile += '</pre></div>'
+			# add the graph and the profile of the trace file
+			traceFile += traceResult
 			traceFile += '</body></html>'
 			# write the traceFile
-			saveFile(pathJoin(projectDirectory,'report/trace/',(fileName+'.html')), traceFile)
+			saveFile(pathJoin(self.reportDirectory,'trace',(fileName+'.html')), traceFile)
+	#######################################################################
+	def traceFile(self,projectDirectory,filePath,recorded):
+		'''
+		Build the graph and profile table of a trace file from the data
+		recorded when it was run, recorded is False if the run failed.
+		Return the html showing the results, the files it links to are
+		next to the trace pages.
+
+		In the profile mode the file ran under cProfile and the call graph
+		is built from the stats. In the sampling mode its stacks were
+		sampled and are drawn as a flamegraph.
+		'''
+		fileName=traceName(filePath)
+		tracePath=pathJoin(self.reportDirectory,'trace',fileName)
+		scriptPath=pathJoin(projectDirectory,relpath(filePath))
+		traceResult = ''
+		if self.traceMode == 'sampling':
+			if not recorded:
+				debug.warning('Failed to sample',filePath)
+				return '<p>No samples were recorded</p>\n'
+			counts = loadFolded(tracePath+'.folded')
+			saveFile(tracePath+'.svg', renderFlamegraph(counts, relpath(filePath)))
+			traceResult += "<object type='image/svg+xml' data='"+fileName+".svg' style='width:100%;'></object>"
+			traceResult += "<hr />"
+			traceResult += '<div>'
+			traceResult += renderSampleTable(counts)
+			traceResult += "<a href='"+fileName+".folded'>Download Folded Stacks</a>"
+			traceResult += '</div>'
+			return traceResult
+		if not recorded:
+			debug.warning('Failed to profile',filePath)
+		# convert the stats into a html table
+		profileTable = renderProfile(tracePath+'.prof', self.traceSortMethod)
+		if recorded:
+			# build the graph from the same stats
+			saveFile(tracePath+'.dot', callGraph(tracePath+'.prof', scriptPath, \
+				self.maxTraceDepth))
+			runCmd(['dot', '-Tpng', tracePath+'.dot'], outputFile=tracePath+'.png')
+		# build the image and link to the image file
+		traceResult += '<a href="'+fileName+'.png"><img style="width:90%;height:90%" src='+fileName+'.png /></a>'
+		traceResult += "<hr />"
+		traceResult += '<div>'
+		# add the cprofile output for the trace file
+		traceResult += profileTable
+		traceResult += "<a href='"+fileName+".prof'>Download Profile</a>"
+		traceResult += '</div>'
+		return traceResult
 	#######################################################################
 	def pylint(self,projectDirectory):
 		'''
 		Run pylint for each .py file found inside of the project directory.
+
+		Results are cached by the content of the file, the pylint config
+		and the pylint version so only changed files are linted again. All
+		the changed files are linted by a single pylint run split across
+		worker processes and both the index and the file pages are built
+		from its json output.
 		'''
 		debug.add('Generating pylint report for each file...')
 		# get the real path of the project directory
 		projectDirectory = realpath(projectDirectory)
 		# get a list of all the python source files, this is to find the paths
 		# of all python source files
-		sourceFiles = findSources(projectDirectory, '.py', self.ignoreList)
+		sourceFiles = self.inventory.find('.py')
 		debug.add('Sourcefiles found',sourceFiles)
+		# everything that changes the pylint output is part of the cache key
+		configPath = '/usr/share/project-report/configs/pylint.cfg'
+		configHash = hashFile(configPath)
+		if configHash == False:
+			configHash = ''
+		pylintVersion = runCmd(['pylint', '--version'])
+		lintCache = diskCache('lint', self.cacheDirectory, self.cacheBytes)
+		# load the cached results and find the files that need linted
+		lintResults = dict()
+		cacheKeys = dict()
+		for filePath in list(sourceFiles):
+			fileHash = hashFile(filePath)
+			if fileHash == False:
+				# git still lists files that can not be read or are broken links
+				debug.add('Can not read source file',filePath)
+				sourceFiles.remove(filePath)
+				continue
+			cacheKeys[filePath] = hashKey('json', fileHash, configHash, pylintVersion)
+			lintResult = lintCache.get(cacheKeys[filePath])
+			if lintResult != False:
+				lintResults[filePath] = json.loads(lintResult.decode('utf-8'))
+		changedFiles = [filePath for filePath in sourceFiles if filePath not in lintResults]
+		debug.add('Files that need linted',changedFiles)
+		# lint all the changed files at once
+		for filePath, lintResult in lintFiles(changedFiles, configPath, self.jobs).items():
+			lintResults[filePath] = lintResult
+		for filePath in changedFiles:
+			# a failed pylint run is tried again on the next report
+			if filePath in lintResults and not lintResults[filePath]['failed']:
+				lintCache.put(cacheKeys[filePath], json.dumps(lintResults[filePath]))
 		# generate the pylint index file
 		lintIndex  = "<html><style>\n"
 		lintIndex += "td{border-width:3px;border-style:solid;}\n"
@@ -557,16 +1000,13 @@ class main():
 			lintIndex += '<a href="'+filePath+'.html">'+filePath+'</a><br />\n'
 		lintIndex += "<hr />\n"
 		lintIndex += "</div>\n"
-		# create file string
-		pylintTempString=''
-		for filePath in sourceFiles:
-			pylintTempString += pathJoin(relpath(projectDirectory),filePath)+' '
-		# add a pylint file for the project directory including all lint stuff inside
-		lintIndex += runCmd('pylint --include-naming-hint="y" -f html '+\
-			'--rcfile="/usr/share/project-report/configs/pylint.cfg" '+\
-			pylintTempString)
-		# save the created index file
-		saveFile(pathJoin(projectDirectory,'report/lint/index.html'), lintIndex)
+		# draw the uml diagrams with one pyreverse run for each package
+		umlDiagrams = drawDiagrams(sourceFiles, projectDirectory, \
+			pathJoin(self.reportDirectory, 'lint', 'uml'), self.jobs, \
+			self.cacheDirectory, self.cacheBytes, debug)
+		# the table of results for each file
+		lintTable = "<table>\n"
+		lintTable += "<tr><th>File</th><th>Statements</th><th>Rating</th></tr>\n"
 		# generate the individual files
 		for filePath in sourceFiles:
 			# grab the filename by spliting the path and poping the last element
@@ -593,59 +1033,60 @@ class main():
 				lintFile += '<a href="'+indexFileName+'.html">'+indexFileName+'</a><br />\n'
 			lintFile += "<hr />\n"
 			lintFile += "</div>\n"
-			# create the uml diagram
-			runCmd('pyreverse '+relpath(filePath)+' -o '+fullFileName+'.dot')
-			if not pathExists(fullFileName+'.dot'):
-				# if the code is python 3 you must use pyreverse3
-				runCmd('pyreverse3 '+relpath(filePath)+' -o '+fullFileName+'.dot')
-			runCmd('dot -Tpng *.'+fullFileName+'.dot > report/lint/'+fileName+'.png')
-			# remove uml file that was previously generated
-			runCmd('rm *.'+fullFileName+'.dot')
-			# build the content
-			lintFile += '<img src='+fileName+'.png />\n'
+			# add the uml diagrams of the package the file is in
+			for diagramName in umlDiagrams.get(filePath, []):
+				lintFile += "<a href='uml/"+diagramName+".svg'><img src='uml/"+diagramName+".png' /></a>\n"
+			lintResult = lintResults.get(filePath, {'messages': [], 'statements': 0})
 			# adding pylint output for the file to the report
-			lintFile += runCmd('pylint --include-naming-hint="y" -f html '+\
-				'--rcfile="/usr/share/project-report/configs/pylint.cfg" '+\
-				filePath)
+			lintFile += renderMessages(lintResult)
 			lintFile += "<hr />\n"
+			lintFile += "</body></html>\n"
 			# write the lintFile
-			saveFile(pathJoin(projectDirectory,'report/lint/',(fileName+'.html')), lintFile)
+			saveFile(pathJoin(self.reportDirectory,'lint',(fileName+'.html')), lintFile)
+			# add the file to the index table
+			fileRating = lintRating([lintResult])
+			lintTable += '<tr><td><a href="'+fileName+'.html">'+relpath(filePath)+'</a></td>'
+			lintTable += '<td>'+str(lintResult['statements'])+'</td>'
+			if fileRating == None:
+				lintTable += '<td>None</td></tr>\n'
+			else:
+				lintTable += '<td>'+('%.2f' % fileRating)+'/10</td></tr>\n'
+		lintTable += "</table>\n"
+		# the rating of the whole project comes from all the results
+		projectResults = list(lintResults.values())
+		projectRating = lintRating(projectResults)
+		if projectRating != None:
+			lintIndex += "<p>Your code has been rated at "+('%.2f' % projectRating)+"/10</p>\n"
+		lintIndex += lintTable
+		lintIndex += "</body></html>\n"
+		# save the rating for the main index page
+		saveFile(pathJoin(self.reportDirectory,'lint','score.json'), json.dumps({
+			'rating': projectRating,
+			'statements': sum(lintResult['statements'] for lintResult in projectResults),
+			'messages': countMessages(projectResults)
+		}))
+		# save the created index file
+		saveFile(pathJoin(self.reportDirectory,'lint','index.html'), lintIndex)
+		# remove the least recently used results if the cache is too large
+		lintCache.prune()
 	#######################################################################
 	def pydocs(self,directory):
 		'''
 		Run pydocs for each .py file in the project directory.
+
+		The documentation is generated by importing each file with pydoc
+		in a worker process for each file and written straight into the
+		report. Pages for unchanged files are copied from the cache.
 		'''
 		debug.add('Generating pydocs section...')
 		# generate python documentation
-		runCmd('mkdir -p report/docs/')
+		makeDirectory(pathJoin(self.reportDirectory,'docs'))
 		# for all python files create documentation files
-		sourceFiles = findSources(directory,'.py', self.ignoreList)
-		for location in sourceFiles:
-			debug.add('Building documentation for',location)
-			# Attempt to run pydoc normally with .py
-			# extension added to the filename
-			runCmd("pydoc -w "+location)
-			if not pathExists(location+'.html'):
-				runCmd("pydoc3 -w "+location)
-			# remove .py extension from the location
-			location=location[:(len(location)-3)]
-			# if no documentation was created by the
-			# first run of pydoc remove the .py extension
-			# to get some modules to work
-			if not pathExists(location+'.html'):
-				runCmd("pydoc -w "+location)
-				if not pathExists(location+'.html'):
-					runCmd("pydoc3 -w "+location)
-			# get the filename by poping off the end of the location
-			fileName=location.split('/').pop()
-			# copy all the created documentation to the report
-			runCmd("mv "+fileName+".html "+pathJoin(directory,'report/docs/'))
-			# convert the location into a folder by removing the filename
-			location=location.split('/')
-			location.pop()
-			location='/'.join(location)
-			# cleanup pydoc generated cache
-			runCmd("rm -rv "+location+"/__pycache__")
+		sourceFiles = self.inventory.find('.py')
+		failedFiles = documentFiles(sourceFiles, pathJoin(self.reportDirectory,'docs'), \
+			self.jobs, self.cacheDirectory, self.cacheBytes, commandrunner.defaultTimeout)
+		for location in failedFiles:
+			debug.add('Failed to build documentation for',location)
 	#######################################################################
 	def gitLog(self):
 		'''
@@ -660,116 +1101,189 @@ class main():
 			header += "\n</style>\n"
 		header += "<script>\n"
 		header += "function toggle(elementId){\n"
-		header += "	if (document.getElementById(elementId).style.display == 'block'){\n"
-		header += "		document.getElementById(elementId).style.display = 'none';\n"
-		header += "	}else if (document.getElementById(elementId).style.display == 'none'){\n"
-		header += "		document.getElementById(elementId).style.display = 'block';\n"
+		header += "	var element = document.getElementById(elementId);\n"
+		header += "	if (element.style.display == 'block'){\n"
+		header += "		element.style.display = 'none';\n"
+		header += "	}else if (element.style.display == 'none'){\n"
+		header += "		element.style.display = 'block';\n"
+		header += "		loadDiff(element);\n"
+		header += "	}\n"
+		header += "}\n"
+		# diffs are stored in their own files and only loaded when opened
+		header += "function loadDiff(element){\n"
+		header += "	var content = element.getElementsByClassName('diffContent')[0];\n"
+		header += "	if (content.getAttribute('data-loaded') == 'true'){\n"
+		header += "		return;\n"
+		header += "	}\n"
+		header += "	content.setAttribute('data-loaded', 'true');\n"
+		header += "	var source = element.getAttribute('data-diff');\n"
+		header += "	var request = new XMLHttpRequest();\n"
+		header += "	request.onload = function(){\n"
+		# the diff is a whole page, only its body is put in the log page
+		header += "		var page = new DOMParser().parseFromString(request.responseText, 'text/html');\n"
+		header += "		content.innerHTML = page.body.innerHTML;\n"
+		header += "	};\n"
+		# browsers block requests for local files so use a frame
+		header += "	request.onerror = function(){\n"
+		header += "		content.innerHTML = \"<iframe src='\"+source+\"' scrolling='no' style='width: 100%;border: none;'></iframe>\";\n"
+		header += "	};\n"
+		header += "	try{\n"
+		header += "		request.open('GET', source);\n"
+		header += "		request.send();\n"
+		header += "	}catch(error){\n"
+		header += "		request.onerror();\n"
 		header += "	}\n"
 		header += "}\n"
+		# the diff pages send their height so their frames fit them
+		header += "window.addEventListener('message', function(event){\n"
+		header += "	if (!event.data || !event.data.diffHeight){\n"
+		header += "		return;\n"
+		header += "	}\n"
+		header += "	var frames = document.getElementsByTagName('iframe');\n"
+		header += "	for (var index = 0; index < frames.length; index++){\n"
+		header += "		if (frames[index].contentWindow == event.source){\n"
+		header += "			frames[index].style.height = event.data.diffHeight+'px';\n"
+		header += "		}\n"
+		header += "	}\n"
+		header += "});\n"
 		header += "</script>\n"
 		header += "</head>\n"
 		header += "<body>\n"
 		header += "<h1><a href='../index.html'>Back</a></h1>\n"
-		# pull all git commit identifiers
-		tempCommits = runCmd('git log --oneline').split('\n')
-		commits = list()
-		for commit in tempCommits:
-			if len(commit) > 2:
-				# grab the commit identifer by grabing the first value split by spaces
-				commits.append(commit.split(' '))
-		commitCounter = 1
-		commitCountdown = len(commits)
-		commitPage = 1
-		# figure out how many pages there will be of commits
-		pages = int(ceil(len(commits) / 10.0))
-		# generate the page links section
-		pageLinks = "<div>\n"
-		for page in range(pages):
-			page += 1
-			pageLinks += "<a href='log"+str(page)+".html'>"+str(page)+"</a>\n"
-		pageLinks += "</div>\n"
-		# for each commit generate the html log and diff
-		logOutput = ""
-		for commit in commits:
-			# increment the total commit counter
-			commitCountdown -= 1
-			# pull the commit message
-			commitMessage = (' '.join(commit[1:]))
-			# start building the commit specific html
-			logOutput += "<hr />\n"
-			logOutput += "<button class='button' style='width: 100%;' onclick='toggle(\""+commit[0]+"\");return false;'>\n"
-			logOutput += "<h2 id='"+commitMessage.replace(' ','_')+"' >"+commitMessage+"</h2>\n"
-			logOutput += "</button>\n"
-			# generate the stats for the commit
-			logOutput += '<code><pre>\n'
-			logOutput += escapeHTML(runCmd("git show --stat "+commit[0]).replace(commitMessage,''))
-			logOutput += '</pre></code>\n'
-			logOutput += "<div id='"+commit[0]+"' class='diff' style='display: none;'>\n"
-			logOutput += '<hr />\n'
-			# start parsing the diff output
-			for line in escapeHTML(runCmd("git diff "+commit[0]+"^ "+commit[0])).split('\n'):
-				if len(line) > 1:
-					# replace all tabs with 4 spaces
-					while '\t' in line:
-						line=line.replace('\t',('&nbsp;'*4))
-					# place added and removed lines into classes to color them with css
-					if line[0] == "+" and line[1] != "+":
-						logOutput += '<span class="addedLine">'+line+'</span><br />\n'
-					elif line[0] == "-" and line[1] != "-":
-						logOutput += '<span class="removedLine">'+line+'</span><br />\n'
-					else:
-						# add endlines to all other lines not added or removed
-						# spaces need converted to NBSP for html
-						logOutput += (line.replace(' ','&nbsp;'))+'<br />\n'
-			logOutput += "<a class='button' style='display: inline-block;width: 100%;' href='#"+commitMessage.replace(' ','_')
-			logOutput += "' onclick='toggle(\""+commit[0]+"\");return true;'>\n"
-			logOutput += "Close Diff\n"
-			logOutput += "</a>\n"
-			logOutput += '</div>\n'
-			# update the commit counter
-			commitCounter += 1
-			# update the counter
-			if commitCounter > 10 or commitCountdown == 0:
-				# add the bottom of the page content
-				logOutput += pageLinks
-				logOutput += "</body>\n"
-				logOutput += "</html>\n"
-				# add the header
-				logOutput = header + pageLinks + logOutput
-				# save the file
-				saveFile('report/log/log'+str(commitPage)+'.html', logOutput)
-				if commitPage == 1:
-					# save the first page as the main log page
-					saveFile('report/log/log.html', logOutput)
-				# clear log output
-				logOutput = ""
-				# reset the commit counter
-				commitCounter = 1
-				# increment the page count
-				commitPage += 1
+		# load the state left by the last run so only new commits are rendered
+		logDirectory = pathJoin(self.reportDirectory,'log')
+		statePath = pathJoin(logDirectory,'state.json')
+		pageSize = self.logPageSize
+		head = headCommit()
+		if head == False:
+			debug.add('No commits found for the git log')
+			return
+		state = loadLogState(statePath)
+		if state != False and state['pageSize'] == pageSize and \
+				state['maxDiffLines'] == self.maxDiffLines and len(state['pages']) > 0 and \
+				state.get('format') == logFormat and isAncestor(state['head'], head):
+			if state['head'] == head:
+				debug.add('Git log is already up to date')
+				return
+			debug.add('Updating git log from',state['head'])
+			# keep all the pages before the last page as they are, the last
+			# page is rendered again along with the new commits
+			previousPages = len(state['pages'])
+			pageCommits = state['pages'][:-1]
+			tailCommits = state['pages'][-1]
+			newRange = state['head']+'..'+head
+			renderCount = countCommits(revisions=[newRange]) + len(tailCommits)
+			commits = chain(readHistory(revisions=[newRange], maxDiffLines=self.maxDiffLines), \
+				readHistory(revisions=['--no-walk=unsorted']+tailCommits[::-1], \
+					maxDiffLines=self.maxDiffLines))
+		else:
+			# there is no state or history was rewritten so render everything
+			debug.add('Rendering full git log')
+			# remove the diffs of commits that may no longer exist
+			removePath(pathJoin(logDirectory,'diff'))
+			# remove the pages, there may be fewer of them now
+			for fileName in listdir(logDirectory):
+				if fileName.startswith('log') and fileName.endswith('.html'):
+					removePath(pathJoin(logDirectory,fileName))
+			previousPages = 0
+			pageCommits = list()
+			renderCount = countCommits(revisions=[head])
+			commits = readHistory(revisions=[head], maxDiffLines=self.maxDiffLines)
+		# pages are numbered from the oldest commit so that the pages that
+		# were already rendered never change, the newest page is log.html
+		keptPages = len(pageCommits)
+		pages = keptPages + int(ceil(renderCount / float(pageSize)))
+		makeDirectory(pathJoin(logDirectory,'diff'))
+		# the diff pages link to the style so they are colored in a frame
+		if pathExists('/usr/share/project-report/configs/style.css'):
+			copyFile('/usr/share/project-report/configs/style.css', pathJoin(logDirectory,'style.css'))
+		# the position of the newest commit counting from the first commit
+		# that is rendered in this run
+		position = renderCount
+		commitPage = None
+		pageRecords = list()
+		# pages are independent so they are rendered by a pool of workers
+		writer = pageWriter(self.jobs)
+		try:
+			for commit in commits:
+				position -= 1
+				page = keptPages + (position // pageSize) + 1
+				if page != commitPage:
+					# a new page has started so send the finished page to be written
+					if commitPage != None:
+						writer.write(logDirectory, commitPage, pages, \
+							self.logPageWindow, header, pageRecords)
+					pageRecords = list()
+					commitPage = page
+					pageCommits.append(list())
+				pageRecords.append(commit)
+				# pages store the commits oldest first
+				pageCommits[-1].insert(0, commit['sha'])
+		except commandError as error:
+			# the pages of an incomplete history are numbered wrong, fail the
+			# stage without saving the state so the next run starts over
+			writer.terminate()
+			debug.error('Failed to read the git log',str(error))
+			raise
+		# write the last page
+		if commitPage != None:
+			writer.write(logDirectory, commitPage, pages, \
+				self.logPageWindow, header, pageRecords)
+		writer.close()
+		# the kept pages close enough to the new pages to link to them only
+		# need their navigation links updated
+		if pages != previousPages:
+			for page in range(max(1, previousPages - 1 - self.logPageWindow), keptPages + 1):
+				updateLogPageLinks(logDirectory, page, pages, self.logPageWindow)
+		# pages were written newest first so put them back in order
+		pageCommits = pageCommits[:keptPages] + pageCommits[keptPages:][::-1]
+		# save the state for the next run
+		saveFile(statePath, json.dumps({
+			'head': head,
+			'pageSize': pageSize,
+			'maxDiffLines': self.maxDiffLines,
+			'format': logFormat,
+			'pages': pageCommits
+		}))
 	#######################################################################
 	def gitStats(self):
 		'''
-		Run gitstats to generate a website containing git repository statistics.
-		Then place it inside the report.
+		Generate a website containing git repository statistics inside the
+		report.
+
+		The statistics are read from a single "git log --numstat" and the
+		state is saved so the next run only reads the new commits.
 		'''
-		# generate git statistics
-		runCmd("gitstats -c processes='8' . report/webstats")
+		statePath = pathJoin(self.reportDirectory,'webstats','state.json')
+		stats = repoStats()
+		if not stats.load(statePath):
+			debug.add('Reading the full history for the stats')
+		try:
+			debug.add('Commits read for the stats',stats.update())
+		except commandError as error:
+			# the stats are missing commits, fail the stage without saving
+			# them so the next run reads the same commits again
+			debug.error('Failed to read the history for the stats',str(error))
+			raise
+		stats.save(statePath)
+		style = ''
+		if pathExists('/usr/share/project-report/configs/style.css'):
+			style = loadFile('/usr/share/project-report/configs/style.css')
+		saveFile(pathJoin(self.reportDirectory,'webstats','index.html'), renderStats(stats, style))
 	#######################################################################
 	def gource(self):
 		'''
 		Run gource to generate a video of the git repository being worked on.
+
+		The video is cached by HEAD and the video settings so it is only
+		rendered when there are new commits.
 		'''
-		# generate a video with gource, try avconv or ffmpeg
-		runCmd("gource --key --max-files 0 -s 1 -c 4 -1280x720 -o - |\
-				ffmpeg -y -r 60 -f image2pipe -vcodec ppm -i - -vcodec libx264\
-				-preset ultrafast -pix_fmt yuv420p -crf 1 -threads 8 -bf 0 \
-				report/video.mp4")
-		if not pathExists('report/video.mp4'):
-			runCmd("gource --key --max-files 0 -s 1 -c 4 -1280x720 -o - |\
-					avconv -y -r 60 -f image2pipe -vcodec ppm -i - -vcodec libx264\
-					-preset ultrafast -pix_fmt yuv420p -crf 1 -threads 8 -bf 0 \
-					report/video.mp4")
+		settings = videoSettings(self.videoPreset, self.videoResolution, \
+			self.videoFps, self.videoQuality, self.videoSegments)
+		debug.add('Gource video settings',settings)
+		if not renderVideo(curdir, pathJoin(self.reportDirectory,'video.mp4'), self.videoEncoder, \
+				settings, self.jobs, self.cacheDirectory, self.cacheBytes, debug):
+			debug.warning('Failed to render the gource video')
 #######################################################################
 # Launch main
 #######################################################################